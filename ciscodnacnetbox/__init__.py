@@ -10,9 +10,51 @@ class CiscoDNACenterConfig(PluginConfig):
     author = App._AUTHOR_
     author_email = App._EMAIL_
     required_settings = []
-    default_settings = {}
+    default_settings = {
+        # Number of rows per bulk_create/bulk_update statement
+        "bulk_batch_size": 500,
+        # Number of Sites or Devices per transaction/savepoint, a failed batch is retried one by one
+        "commit_batch_size": 100,
+        # Number of Devices per page from the Cisco DNA Center Inventory (max 500)
+        "page_size": 500,
+        # Number of Cisco DNA Center Instances queried at the same time
+        "max_workers": 4,
+        # Seconds before a Cisco DNA Center token is renewed (tokens expire after 1 hour)
+        "token_ttl": 3000,
+        # Seconds before the Device to Site membership cache is fully refreshed (bypassed by reconcile and plans)
+        "site_members_ttl": 900,
+        # Skip Sites and Devices that are unchanged since the last sync
+        "incremental": True,
+        # Seconds before the Status Dashboard is refreshed in the background
+        "status_ttl": 300,
+        # Seconds before the cached Devices and Sites pages are refreshed in the background
+        "inventory_ttl": 900,
+        # Days the history of sync runs is kept
+        "run_retention": 30,
+        # Seconds before a Sync job of a Cisco DNA Center is considered stale
+        "sync_timeout": 3600,
+        # Seconds between two runs of the scheduler (Settings with a sync interval)
+        "scheduler_tick": 60,
+        # Requests per minute per Cisco DNA Center, None to pace only after the first 429 (lowered on 429, then recovers)
+        "rate_limit": None,
+        # Retries of a throttled, unavailable or unreachable API call
+        "retries": 5,
+        # Seconds of the first retry, doubled per retry (with jitter) up to backoff_max
+        "backoff": 1.0,
+        "backoff_max": 60,
+        # Secret of the Event Notifications webhook (Authorization header), None disables the webhook
+        "events_secret": None,
+        # Push the progress of background syncs with Server-Sent Events (needs an async or gevent web worker)
+        "progress_sse": False,
+        # Sync areas as Regions, buildings as Sites and floors as Locations (instead of Sites only)
+        "site_hierarchy": False,
+    }
     base_url = App._NAME_
     caching_config = {}
 
+    def ready(self):
+        super().ready()
+        from . import signals  # noqa: F401
+
 
 config = CiscoDNACenterConfig
@@ -0,0 +1,7 @@
+from django.urls import path
+from .. import views
+
+urlpatterns = (
+    # Cisco DNA Center Event Notifications (webhook)
+    path("events/", views.EventsView.as_view(), name="events"),
+)
@@ -1,12 +1,21 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
-from dnacentersdk import api
 from ..models import Settings
+from .aio import AsyncClient
+from .client import Client
+from .monitoring import Prometheus
+from .utilities import System
 
 
 class CiscoDNAC:
 
-    # Get all tenants from Settings
-    __tenants = Settings.objects.all()
+    # Authenticated API Clients shared within the process (keyed by Settings pk)
+    __clients = {}
+    __lock = threading.Lock()
 
     def __init__(self, **kwargs):
         """
@@ -29,17 +38,21 @@ class CiscoDNAC:
                 self.dnac[tenant.hostname] = obj[1]
             return
 
-        for tenant in self.__tenants:
+        # Get all tenants from Settings
+        enabled = []
+        for tenant in Settings.objects.all():
             self.dnac_status[tenant.hostname] = "disabled"
 
             # Create Cisco DNA Center API Object if enabled
             if tenant.status is True:
+                enabled.append(tenant)
 
-                # Create Cisco DNA Center API Object
-                obj = self.auth(tenant)
+        # Create Cisco DNA Center API Objects concurrently
+        with ThreadPoolExecutor(max_workers=System.Config.get("max_workers")) as pool:
+            for tenant, obj in zip(enabled, pool.map(self.auth, enabled)):
 
                 # Check that Auth is successful
-                if obj:
+                if obj[0]:
                     self.dnac[tenant.hostname] = obj[1]
         return
 
@@ -48,25 +61,140 @@ class CiscoDNAC:
         Cisco DNA Center API Object
         """
         try:
-            obj = api.DNACenterAPI(
-                username=tenant.username,
-                password=tenant.password,
-                base_url="https://" + tenant.hostname,
-                # version="2.1.2",  # TODO
-                verify=bool(tenant.verify),
-            )
+            obj = self.client(tenant)
+            obj.login()
             self.dnac_status[tenant.hostname] = "success"
             return True, obj
         except Exception as error_msg:
             print("Error for {}: {}".format(tenant, error_msg))
+            Prometheus.auth_failures.labels(tenant=tenant.hostname).inc()
+            self.invalidate(tenant.pk)
             self.dnac_status[tenant.hostname] = error_msg
             return False, None
 
+    @classmethod
+    def client(cls, tenant):
+        """
+        Cached Cisco DNA Center API Client, replaced when Settings are edited
+        """
+        with cls.__lock:
+            obj = cls.__clients.get(tenant.pk)
+            if obj is None or obj.last_updated != tenant.last_updated:
+                cls.close(obj)
+                # asyncio Client if selected and httpx is installed
+                if tenant.client == "async" and AsyncClient.available():
+                    obj = AsyncClient(tenant)
+                else:
+                    if tenant.client == "async":
+                        print(
+                            "Error for {}: httpx is not installed, using dnacentersdk".format(
+                                tenant.hostname
+                            )
+                        )
+                    obj = Client(tenant)
+                cls.__clients[tenant.pk] = obj
+            return obj
+
+    @classmethod
+    def invalidate(cls, pk):
+        """
+        Remove cached Cisco DNA Center API Client
+        """
+        with cls.__lock:
+            cls.close(cls.__clients.pop(pk, None))
+
+    @staticmethod
+    def close(obj):
+        """
+        Close the connections of a replaced asyncio Client (httpx)
+        """
+        if isinstance(obj, AsyncClient):
+            obj.close()
+
+    def fetch(self, **funcs):
+        """
+        Run API calls against all Cisco DNA Center Instances concurrently
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=System.Config.get("max_workers")) as pool:
+            futures = {
+                (hostname, name): pool.submit(func, tenant=dnac)
+                for hostname, dnac in self.dnac.items()
+                for name, func in funcs.items()
+            }
+            for (hostname, name), future in futures.items():
+                results.setdefault(hostname, {})[name] = future.result()
+        return results
+
+    def device_pages(self, tenant):
+        """
+        Get Devices from Cisco DNA Center, one page at a time
+        """
+        limit = System.Config.get("page_size")
+        offset = 1
+        if isinstance(tenant, AsyncClient):
+            yield from self.device_pages_concurrent(tenant, limit)
+            return
+        while True:
+            page = tenant.devices.get_network_device_by_pagination_range(
+                start_index=offset, records_to_return=limit
+            ).response
+            if len(page) != 0:
+                yield page
+            if len(page) < limit:
+                return
+            offset += limit
+
+    def device_pages_concurrent(self, tenant, limit):
+        """
+        Get Devices from Cisco DNA Center, a window of pages at the same time
+        """
+        total = tenant.devices.get_device_count().response
+        window = System.Config.get("max_workers")
+        offset = 1
+        while True:
+            # Pages left according to the count, at least one to detect the end
+            count = max(1, min(window, -(-(total - offset + 1) // limit)))
+            pages = tenant.gather(
+                [
+                    (
+                        "devices",
+                        "get_network_device_by_pagination_range",
+                        {"start_index": offset + i * limit, "records_to_return": limit},
+                    )
+                    for i in range(count)
+                ]
+            )
+            for page in pages:
+                page = page.response
+                if len(page) != 0:
+                    yield page
+                if len(page) < limit:
+                    return
+            offset += count * limit
+
     def devices(self, tenant):
         """
         Get Devices from Cisco DNA Center
         """
-        return tenant.devices.get_device_list().response
+        return [device for page in self.device_pages(tenant) for device in page]
+
+    def devices_count(self, tenant):
+        """
+        Get Devices count from Cisco DNA Center
+        """
+        return tenant.devices.get_device_count().response
+
+    def devices_supported(self, tenant):
+        """
+        Get count of supported Devices from Cisco DNA Center
+        """
+        count = 0
+        for page in self.device_pages(tenant):
+            for device in page:
+                if device.deviceSupportLevel == "Supported":
+                    count += 1
+        return count
 
     def sites(self, tenant):
         """
@@ -80,14 +208,84 @@ class CiscoDNAC:
         """
         return tenant.sites.get_site_count().response
 
-    @classmethod
-    def devices_to_sites(cls, tenant):
+    def site_members(self, tenant, site_id):
+        """
+        Get Device Serial Numbers of a Site from Cisco DNA Center
+        """
+        return self.serials(tenant.sites.get_membership(site_id=site_id))
+
+    @staticmethod
+    def serials(membership):
+        """
+        Device Serial Numbers of a Site membership
+        """
+        results = []
+        for members in membership.device:
+            for device in members.response:
+                results.append(device.serialNumber)
+        return results
+
+    def devices_to_sites(self, tenant, sites, devices=(), refresh=False):
         """
         Map Device Serial Number to Site ID from Cisco DNA Center
+
+        `sites` is the list of Site IDs already known (parents before children)
+        and `devices` the Serial Numbers that must be resolved. The membership
+        of each Site is cached between runs, and only new Sites are looked up
+        again. Cisco DNA Center has no change marker for a membership, so an
+        unknown Serial Number refreshes every Site, as does an expired cache
+        or `refresh` (a Device moved between known Sites isn't noticed before).
+        Serial Numbers found in no Site are kept too, so that Devices without
+        a Site don't refresh every Site again before the cache expires.
         """
+        key = "ciscodnacnetbox_members_{}".format(tenant.hostname)
+        index = None if refresh else cache.get(key)
+        if index is None:
+            index = {
+                "expires": time.time() + System.Config.get("site_members_ttl"),
+                "sites": {},
+                "unassigned": set(),
+            }
+            refresh = list(sites)
+        else:
+            # Drop removed Sites and only lookup new Sites
+            known_sites = set(sites)
+            index["sites"] = {
+                k: v for k, v in index["sites"].items() if k in known_sites
+            }
+            refresh = [site for site in sites if site not in index["sites"]]
+            known = {s for members in index["sites"].values() for s in members}
+            known.update(index.setdefault("unassigned", set()))
+            if any(serial not in known for serial in devices):
+                refresh = list(sites)
+
+        # Get memberships with bounded concurrent requests
+        if len(refresh) != 0 and isinstance(tenant, AsyncClient):
+            memberships = tenant.gather(
+                [("sites", "get_membership", {"site_id": s}) for s in refresh]
+            )
+            for site_id, membership in zip(refresh, memberships):
+                index["sites"][site_id] = self.serials(membership)
+        elif len(refresh) != 0:
+            with ThreadPoolExecutor(
+                max_workers=System.Config.get("max_workers")
+            ) as pool:
+                members = pool.map(partial(self.site_members, tenant), refresh)
+                for site_id, serials in zip(refresh, members):
+                    index["sites"][site_id] = serials
+        if len(refresh) == len(sites):
+            # Every Site was looked up, the other Serial Numbers have no Site
+            known = {s for members in index["sites"].values() for s in members}
+            index["unassigned"] = {
+                serial
+                for serial in index["unassigned"].union(devices)
+                if serial not in known
+            }
+        cache.set(key, index, timeout=max(1, int(index["expires"] - time.time())))
+
+        # Last Site wins, so a Device is mapped to its most specific Site
         results = {}
-        for site in tenant.sites.get_site().response:
-            for members in tenant.sites.get_membership(site_id=site.id).device:
-                for device in members.response:
-                    results[device.serialNumber] = site.id
+        for site_id in sites:
+            for serial in index["sites"].get(site_id, []):
+                results[serial] = site_id
         return results
@@ -0,0 +1,241 @@
+import asyncio
+import threading
+import time
+from .client import Client, Namespace
+from .limiter import Backoff, RateLimiter
+from .monitoring import Prometheus
+from .utilities import System
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class Record(dict):
+    """
+    JSON object with attribute access, like the dnacentersdk responses
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class AsyncClient:
+    """
+    Cisco DNA Center API over a pooled asyncio HTTP client (httpx)
+
+    All AsyncClients of the process share one event loop, running in a
+    background thread, so calls from any thread (and many at once through
+    `gather`) are multiplexed over keep-alive connections. API calls that
+    aren't listed in `endpoints` are sent with the dnacentersdk Client.
+    """
+
+    endpoints = {
+        ("sites", "get_site"): "/dna/intent/api/v1/site",
+        ("sites", "get_site_count"): "/dna/intent/api/v1/site/count",
+        ("sites", "get_membership"): "/dna/intent/api/v1/membership/{site_id}",
+        ("devices", "get_device_count"): "/dna/intent/api/v1/network-device/count",
+        (
+            "devices",
+            "get_network_device_by_pagination_range",
+        ): "/dna/intent/api/v1/network-device/{start_index}/{records_to_return}",
+    }
+
+    # Event loop shared by all AsyncClients within the process
+    __loop = None
+    __loop_lock = threading.Lock()
+
+    def __init__(self, tenant):
+        self.pk = tenant.pk
+        self.hostname = tenant.hostname
+        self.last_updated = tenant.last_updated
+        self.username = tenant.username
+        self.password = tenant.password
+        self.verify = bool(tenant.verify)
+        self.sdk = Client(tenant)
+        self.http = None
+        self.token = None
+        self.expires = 0
+        self.lock = None
+        # Calls in flight, the connections are closed once they are done
+        self.active = 0
+        self.closing = False
+
+    def __getattr__(self, name):
+        # Resolve `client.sites.get_site()` style calls through request()
+        return Namespace(self, name)
+
+    @staticmethod
+    def available():
+        return httpx is not None
+
+    @classmethod
+    def loop(cls):
+        """
+        Shared event loop, started on first use
+        """
+        with cls.__loop_lock:
+            if cls.__loop is None:
+                cls.__loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=cls.__loop.run_forever,
+                    name="ciscodnacnetbox-asyncio",
+                    daemon=True,
+                ).start()
+            return cls.__loop
+
+    def run(self, coroutine):
+        """
+        Run a coroutine on the shared event loop and wait for the result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop()).result()
+
+    def login(self):
+        """
+        Request a new token from Cisco DNA Center
+        """
+        self.run(self.authenticate())
+
+    def close(self):
+        """
+        Close the pooled connections of a replaced Client, without waiting
+        """
+        asyncio.run_coroutine_threadsafe(self.aclose(), self.loop())
+
+    async def aclose(self):
+        self.closing = True
+        if self.active == 0 and self.http is not None:
+            http = self.http
+            self.http = None
+            # A late call (e.g. a running sync) logs in and connects again
+            self.expires = 0
+            await http.aclose()
+
+    def request(self, namespace, method, *args, **kwargs):
+        """
+        Cisco DNA Center API call, same interface as the dnacentersdk Client
+        """
+        if (namespace, method) not in self.endpoints:
+            return self.sdk.request(namespace, method, *args, **kwargs)
+        return self.run(self.call(namespace, method, **kwargs))
+
+    def gather(self, calls):
+        """
+        Run API calls concurrently, `calls` is a list of (namespace, method, kwargs)
+
+        At most `max_workers` calls of the Client are in flight at the time.
+        """
+
+        async def bounded(semaphore, namespace, method, kwargs):
+            async with semaphore:
+                return await self.call(namespace, method, **kwargs)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(System.Config.get("max_workers"))
+            return await asyncio.gather(*[bounded(semaphore, *call) for call in calls])
+
+        return self.run(run_all())
+
+    async def authenticate(self, token=None):
+        """
+        Renew the token, unless another call already renewed `token`
+        """
+        # The event loop is single threaded, so the lock is created once
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if token is not None and token != self.token:
+                return
+            if token is None and time.time() < self.expires:
+                return
+            if self.http is None:
+                self.http = httpx.AsyncClient(
+                    base_url="https://" + self.hostname,
+                    verify=self.verify,
+                    timeout=60,
+                    limits=httpx.Limits(
+                        max_connections=System.Config.get("max_workers"),
+                        max_keepalive_connections=System.Config.get("max_workers"),
+                    ),
+                )
+            response = await self.send(
+                "auth",
+                "POST",
+                "/dna/system/api/v1/auth/token",
+                auth=(self.username, self.password),
+            )
+            response.raise_for_status()
+            self.token = response.json()["Token"]
+            self.expires = time.time() + System.Config.get("token_ttl")
+
+    async def call(self, namespace, method, **kwargs):
+        """
+        Cisco DNA Center API call, authenticate again on expired token
+
+        Paced and retried like the dnacentersdk Client (RateLimiter, Backoff).
+        """
+        self.active += 1
+        try:
+            endpoint = "{}.{}".format(namespace, method)
+            path = self.endpoints[(namespace, method)].format(**kwargs)
+            limiter = RateLimiter.get(self.hostname)
+            retries = System.Config.get("retries")
+            attempt = 0
+            renewed = False
+            while True:
+                await self.authenticate()
+                token = self.token
+                await asyncio.sleep(limiter.reserve())
+                try:
+                    response = await self.send(
+                        endpoint, "GET", path, headers={"X-Auth-Token": token}
+                    )
+                except httpx.TransportError:
+                    if attempt >= retries:
+                        raise
+                    retry_after = None
+                else:
+                    if response.status_code == 401 and renewed is False:
+                        # Token revoked or expired before `token_ttl`
+                        await self.authenticate(token=token)
+                        renewed = True
+                        continue
+                    if response.status_code not in Backoff.STATUS or attempt >= retries:
+                        response.raise_for_status()
+                        limiter.success()
+                        return response.json(object_hook=Record)
+                    retry_after = Backoff.retry_after(response.headers)
+                    if response.status_code == 429:
+                        limiter.throttled(retry_after)
+                await asyncio.sleep(Backoff.delay(attempt, retry_after))
+                attempt += 1
+        finally:
+            self.active -= 1
+            if self.closing and self.active == 0:
+                await self.aclose()
+
+    async def send(self, endpoint, method, path, **kwargs):
+        """
+        Single HTTP request, recorded for Metrics and Prometheus
+        """
+        error = None
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, **kwargs)
+            if response.status_code >= 400:
+                error = str(response.status_code)
+            return response
+        except Exception:
+            error = "exception"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            Client.record(seconds)
+            Prometheus.request(self.hostname, endpoint, seconds, error)
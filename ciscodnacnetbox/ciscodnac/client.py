@@ -0,0 +1,152 @@
+import threading
+import time
+from functools import partial
+import requests
+from dnacentersdk import api
+from dnacentersdk.exceptions import ApiError
+from .limiter import Backoff, RateLimiter
+from .monitoring import Prometheus
+from .utilities import System
+
+
+class Client:
+    """
+    Authenticated Cisco DNA Center API, reused until the token expires
+    """
+
+    # API calls and their total duration within the process
+    __stats = [0, 0.0]
+    __stats_lock = threading.Lock()
+
+    def __init__(self, tenant):
+        self.pk = tenant.pk
+        self.hostname = tenant.hostname
+        self.last_updated = tenant.last_updated
+        self.username = tenant.username
+        self.password = tenant.password
+        self.verify = bool(tenant.verify)
+        self.api = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Resolve `client.sites.get_site()` style calls through request()
+        return Namespace(self, name)
+
+    def login(self, api_obj=None):
+        """
+        Request a new token from Cisco DNA Center
+        """
+        with self.lock:
+            # Another thread may already have renewed the token
+            if api_obj is not None and self.api is not api_obj:
+                return
+            if api_obj is None and time.time() < self.expires:
+                return
+            self.api = self.call(
+                api.DNACenterAPI,
+                "auth",
+                username=self.username,
+                password=self.password,
+                base_url="https://" + self.hostname,
+                # version="2.1.2",  # TODO
+                verify=self.verify,
+                # 429 is handled by request(), so that the RateLimiter adapts
+                wait_on_rate_limit=False,
+            )
+            self.expires = time.time() + System.Config.get("token_ttl")
+
+    def request(self, namespace, method, *args, **kwargs):
+        """
+        Cisco DNA Center API call, authenticate again on expired token
+
+        Calls are paced by the RateLimiter of the Cisco DNA Center, throttled
+        and unavailable (or unreachable) calls are retried with Backoff.
+        """
+        endpoint = "{}.{}".format(namespace, method)
+        limiter = RateLimiter.get(self.hostname)
+        retries = System.Config.get("retries")
+        attempt = 0
+        renewed = False
+        while True:
+            self.login()
+            api_obj = self.api
+            time.sleep(limiter.reserve())
+            try:
+                result = self.call(
+                    getattr(getattr(api_obj, namespace), method),
+                    endpoint,
+                    *args,
+                    **kwargs,
+                )
+            except ApiError as error_msg:
+                if error_msg.status_code == 401 and renewed is False:
+                    # Token revoked or expired before `token_ttl`
+                    self.login(api_obj=api_obj)
+                    renewed = True
+                    continue
+                if error_msg.status_code not in Backoff.STATUS or attempt >= retries:
+                    raise
+                retry_after = getattr(error_msg, "retry_after", None)
+                if retry_after is None:
+                    response = getattr(error_msg, "response", None)
+                    retry_after = Backoff.retry_after(
+                        getattr(response, "headers", None)
+                    )
+                if error_msg.status_code == 429:
+                    limiter.throttled(retry_after)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+                retry_after = None
+            else:
+                limiter.success()
+                return result
+            time.sleep(Backoff.delay(attempt, retry_after))
+            attempt += 1
+
+    def call(self, func, endpoint, *args, **kwargs):
+        """
+        Single Cisco DNA Center API call, recorded for Metrics and Prometheus
+        """
+        error = None
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except ApiError as error_msg:
+            error = str(error_msg.status_code)
+            raise
+        except Exception:
+            error = "exception"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(seconds)
+            Prometheus.request(self.hostname, endpoint, seconds, error)
+
+    @classmethod
+    def record(cls, seconds):
+        with cls.__stats_lock:
+            cls.__stats[0] += 1
+            cls.__stats[1] += seconds
+
+    @classmethod
+    def stats(cls):
+        """
+        Count and total seconds of API calls, see `Metrics`
+        """
+        with cls.__stats_lock:
+            return tuple(cls.__stats)
+
+
+class Namespace:
+    """
+    Cisco DNA Center API namespace (e.g. `sites`, `devices`) of a Client
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getattr__(self, method):
+        return partial(self.client.request, self.name, method)
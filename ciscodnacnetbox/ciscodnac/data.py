@@ -1,43 +1,227 @@
+import time
+import uuid
+from datetime import timedelta
 from . import CiscoDNAC
 
 # from cacheops import cache, CacheMiss
 from django.core.cache import cache
-from dcim.models import Site, Device
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from dcim.models import Device, Location, Region, Site
 from dcim.choices import DeviceStatusChoices
 from tenancy.models import Tenant
 from django_rq import get_queue, job
-from ..models import Settings
+from rq import get_current_job
+from ..models import Settings, SyncRecord, SyncRun
+from .metrics import Metrics
+from .monitoring import Prometheus
 from .netbox import Netbox
+from .events import Events
+from .hierarchy import Hierarchy
+from .progress import Progress
+from .scheduler import Scheduler
 from .utilities import System
 
 
 @job("default")
 def full_sync(**kwargs):
     """
-    RQ Background Task for Syncing Cisco DNA Center Instances
+    RQ Background Task for collecting the Sync of Cisco DNA Center Instances
     """
-    data = {}
+    # Counters of every stage, written to the Sync Run by `sync_tenant`
+    counters = SyncRun.objects.filter(pk=kwargs["run"]).values_list(
+        "counters", flat=True
+    )
+    counters = counters.first() or {}
 
-    # Sync all func from Cisco DNA Center
-    sites = Data.sync_sites(**kwargs)
-    devices = Data.sync_devices(**kwargs)
+    # Count the synced items per Tenant and stage
+    data = {}
+    for tenant in kwargs["jobs"]:
+        data[tenant] = counters.get(tenant, {})
+        for stage in ["sites", "devices"]:
+            # Stage job lost (e.g. killed worker) or not run
+            data[tenant].setdefault(stage, "Error: No result")
+    for tenant in kwargs["locked"]:
+        data[tenant] = {
+            "sites": "Error: Sync already running",
+            "devices": "Error: Sync already running",
+        }
 
-    # Count the synced items
-    for tenant in sites:
-        data[tenant] = {}
-        Netbox.Purge.database(tenant=tenant, type="devices", data=devices[tenant])
-        Netbox.Purge.database(tenant=tenant, type="sites", data=sites[tenant])
-    for tenant in sites:
-        data[tenant]["sites"] = len(sites[tenant])
-    for tenant in devices:
-        data[tenant]["devices"] = len(devices[tenant])
+    # Counters are kept with the Sync Run, the Records are in the database
+    Data.run_finish(kwargs.get("run"), data)
 
     # Return data as results for the job
+    Progress.finish(get_current_job().id)
+    return {"run": kwargs.get("run"), "tenants": data}
+
+
+@job("default")
+def sync_tenant(stage, pk, **kwargs):
+    """
+    RQ Background Task for Syncing one stage of a Cisco DNA Center Instance
+    """
+    report = {}
+    purged = {}
+    metrics = Metrics()
+    progress = Progress(kwargs.pop("progress", None))
+    run = kwargs.pop("run", None)
+    result = None
+    count = 0
+    start = time.perf_counter()
+    try:
+        params = {
+            "report": report,
+            "purged": purged,
+            "metrics": metrics,
+            "progress": progress,
+        }
+        if stage == "sites":
+            results = Data.sync_sites(pk=pk, **params, **kwargs)
+        else:
+            results = Data.sync_devices(pk=pk, **params, **kwargs)
+        if len(results) == 0:
+            Prometheus.sync_failures.labels(tenant=kwargs["tenant"], stage=stage).inc()
+            result = {
+                stage: "Error: Cisco DNA Center not reachable",
+                "metrics": {stage: metrics.results()},
+            }
+            return result
+        count = len(results[kwargs["tenant"]])
+        unchanged = Data.record(run, kwargs["tenant"], stage, results[kwargs["tenant"]])
+        Data.record(run, kwargs["tenant"], stage, purged.get(kwargs["tenant"], []))
+        if stage == "devices":
+            # Without save(), so that the Settings aren't seen as edited
+            Settings.objects.filter(pk=pk).update(last_synced=timezone.now())
+        Prometheus.sync(
+            tenant=kwargs["tenant"],
+            stage=stage,
+            seconds=time.perf_counter() - start,
+            results=results[kwargs["tenant"]],
+            deleted=report.get(kwargs["tenant"], {}).get(stage + "_deleted", 0),
+            metrics=metrics,
+        )
+        result = {
+            stage: len(results[kwargs["tenant"]]),
+            stage + "_unchanged": unchanged,
+            **report.get(kwargs["tenant"], {}),
+            "metrics": {stage: metrics.results()},
+        }
+        return result
+    except Exception as error_msg:
+        # Don't fail the job, so that the dependent jobs still run
+        print("Error for {}: {}".format(kwargs["tenant"], error_msg))
+        Prometheus.sync_failures.labels(tenant=kwargs["tenant"], stage=stage).inc()
+        result = {
+            stage: "Error: {}".format(error_msg),
+            "metrics": {stage: metrics.results()},
+        }
+        return result
+    finally:
+        progress.update(kwargs["tenant"], stage, "done", done=count, final=True)
+
+        # Collected by `full_sync` from the Sync Run, not from the job result
+        if result is not None:
+            Data.run_update(run, kwargs["tenant"], result)
+
+        # Devices is the last stage for the Tenant
+        if stage == "devices":
+            cache.delete("ciscodnacnetbox_lock_{}".format(pk))
+
+
+@job("default")
+def plan_sync(**kwargs):
+    """
+    RQ Background Task for planning the Sync of Cisco DNA Center Instances
+    """
+    data = Data.plan(progress=Progress(get_current_job().id), **kwargs)
+    Progress.finish(get_current_job().id)
     return data
 
 
+@job("default")
+def refresh_status():
+    """
+    RQ Background Task for refreshing the Status Dashboard
+    """
+    Data.status_refresh()
+
+
+@job("default")
+def schedule_sync():
+    """
+    RQ Background Task of the Scheduler, queues itself again every tick
+    """
+    if Scheduler.acquire() is False:
+        # Another chain of ticks is running
+        return
+    try:
+        Scheduler.alive()
+        for tenant in Scheduler.tick():
+            Data.sync_enqueue(pk=tenant.pk)
+    finally:
+        get_queue("default").enqueue_in(
+            timedelta(seconds=System.Config.get("scheduler_tick")), schedule_sync
+        )
+
+
+@job("default")
+def sync_event(pk, kind, key, attempt=0):
+    """
+    RQ Background Task for Syncing the Device or Site of an event
+    """
+    # Queued again by the next event from now on
+    cache.delete("ciscodnacnetbox_event_{}_{}_{}".format(pk, kind, key))
+
+    # Wait for a running Sync of the Tenant, it may not have seen the change
+    if cache.get("ciscodnacnetbox_lock_{}".format(pk)) is not None:
+        if attempt < 10:
+            get_queue("default").enqueue_in(
+                timedelta(seconds=60), sync_event, pk, kind, key, attempt + 1
+            )
+        return {"sync_status": "Error: Sync already running"}
+    run = Data.run_start("event", job_id=get_current_job().id)
+    result = Data.sync_event(pk, kind, key)
+    tenant = Settings.objects.filter(pk=pk).values_list("hostname", flat=True).first()
+    unchanged = Data.record(run.pk, tenant, kind + "s", [{"key": key, **result}])
+    Data.run_finish(
+        run.pk,
+        {tenant: {kind: result["sync_status"], kind + "s_unchanged": unchanged}},
+    )
+    return {"run": run.pk, **result}
+
+
+@job("default")
+def refresh_inventory(kind, pk):
+    """
+    RQ Background Task for refreshing the cached Inventory of a Cisco DNA Center
+    """
+    Data.inventory_refresh(kind, pk)
+
+
 class Data:
-    def status():
+    @classmethod
+    def status(cls, refresh=False):
+        """
+        Plugin Status Dashboard (cached snapshot)
+        """
+        data = cache.get("ciscodnacnetbox_status")
+        if data is None or refresh is True:
+            return cls.status_refresh()
+
+        # Serve the stale snapshot and refresh it in the background
+        age = (timezone.now() - data["timestamp"]).total_seconds()
+        if age > System.Config.get("status_ttl"):
+            if cache.add(
+                "ciscodnacnetbox_status_bg",
+                True,
+                timeout=System.Config.get("status_ttl"),
+            ):
+                refresh_status.delay()
+        return data
+
+    @staticmethod
+    def status_refresh():
         """
         Plugin Status Dashboard
         """
@@ -56,21 +240,21 @@ class Data:
         # Get API status per Cisco DNA Center
 
         for k, v in tenants.dnac_status.items():
-            data["dnac"][k]["api"] = v
+            data["dnac"][k]["api"] = str(v)
 
         # Get data from Cisco DNA Center
-        for tenant, dnac in tenants.dnac.items():
-            data["dnac"][tenant]["sites"] = tenants.sites_count(tenant=dnac)
-            data["dnac"][tenant]["devices"] = 0
-            for device in tenants.devices(tenant=dnac):
-                if device.deviceSupportLevel == "Supported":
-                    data["dnac"][tenant]["devices"] += 1
+        fetched = tenants.fetch(
+            sites=tenants.sites_count, devices=tenants.devices_supported
+        )
+        for tenant, dnac in fetched.items():
+            data["dnac"][tenant]["sites"] = dnac["sites"]
+            data["dnac"][tenant]["devices"] = dnac["devices"]
 
         # Gather data from NetBox
         data["netbox"] = {}
         dnac_tag = System.PluginTag.get()
-        data["netbox"]["sites"] = len(Site.objects.filter(tags=dnac_tag))
-        data["netbox"]["devices"] = len(Device.objects.filter(tags=dnac_tag))
+        data["netbox"]["sites"] = Site.objects.filter(tags=dnac_tag).count()
+        data["netbox"]["devices"] = Device.objects.filter(tags=dnac_tag).count()
         data["netbox"]["tenants"] = {}
 
         # Gather Tenants that is related to Cisco DNA Center
@@ -84,55 +268,267 @@ class Data:
                 "created": tenant.created,
                 "managed": managed,
             }
+
+        # Cache the snapshot until the next refresh
+        data["timestamp"] = timezone.now()
+        cache.set("ciscodnacnetbox_status", data, timeout=None)
+        cache.delete("ciscodnacnetbox_status_bg")
         return data
 
-    def devices(**kwargs):
+    @classmethod
+    def devices(cls, **kwargs):
+        """
+        Cisco DNA Center Instance Devices (cached Inventory, no sync)
+        """
+        return cls.inventory("devices", **kwargs)
+
+    @classmethod
+    def sites(cls, **kwargs):
+        """
+        Cisco DNA Center Sites (cached Network Designs, no sync)
+        """
+        return cls.inventory("sites", **kwargs)
+
+    @staticmethod
+    def devices_rows(devices):
+        """
+        Cisco DNA Center Devices as rows of the Devices page
+        """
+        columns = [
+            "hostname",
+            "reachabilityStatus",
+            "role",
+            "type",
+            "platformId",
+            "managementIpAddress",
+            "serialNumber",
+        ]
+        return [
+            {column: device.get(column) for column in columns} for device in devices
+        ]
+
+    @staticmethod
+    def sites_rows(sites):
+        """
+        Cisco DNA Center Sites as rows of the Sites page
+        """
+        results = []
+        for site in sites:
+            result = {
+                "name": site["name"],
+                "siteNameHierarchy": site["siteNameHierarchy"],
+                "type": None,
+                "country": None,
+            }
+
+            # Get addtional data about the location
+            for additionalInfo in site.get("additionalInfo", []):
+                if "Location" in additionalInfo["nameSpace"]:
+                    result["type"] = additionalInfo["attributes"].get("type")
+                    result["country"] = additionalInfo["attributes"].get("country")
+            results.append(result)
+        return results
+
+    @classmethod
+    def inventory(cls, kind, refresh=False, **kwargs):
         """
-        Cisco DNA Center Instance Devices
+        Cached Inventory (`devices` or `sites`) per Cisco DNA Center
+
+        Pages are rendered from the cache. A missing, stale (older than
+        `inventory_ttl`) or `refresh` Inventory is fetched again by a RQ
+        Background Task, or right away if no RQ workers are running.
         """
+        if "pk" in kwargs:
+            tenants = [get_object_or_404(Settings, pk=kwargs["pk"])]
+        else:
+            tenants = list(Settings.objects.filter(status=True))
 
-        # Gather all devices from Cisco DNA Center Inventory (no sync)
         data = {}
-        tenants = CiscoDNAC(**kwargs)
-        for tenant, dnac in tenants.dnac.items():
-            data[tenant] = tenants.devices(tenant=dnac)
+        pending = []
+        for tenant in tenants:
+            entry = cache.get(cls.inventory_key(kind, tenant.hostname))
+            if entry is None:
+                entry = {"timestamp": None, "items": [], "error": None}
+            stale = entry["timestamp"] is None or (
+                timezone.now() - entry["timestamp"]
+            ).total_seconds() > System.Config.get("inventory_ttl")
+            if stale or refresh is True:
+                pending.append(tenant)
+            elif cache.get(cls.inventory_key(kind, tenant.hostname, "bg")):
+                # Refresh requested before, still running
+                entry["refreshing"] = True
+            data[tenant.hostname] = entry
+
+        # Refresh in the background, once per Cisco DNA Center
+        rq = len(pending) != 0 and System.RQ.status()
+        for tenant in pending:
+            if rq is False:
+                data[tenant.hostname] = cls.inventory_refresh(kind, tenant.pk)
+                continue
+            if cache.add(
+                cls.inventory_key(kind, tenant.hostname, "bg"),
+                True,
+                timeout=System.Config.get("sync_timeout"),
+            ):
+                refresh_inventory.delay(kind, tenant.pk)
+            data[tenant.hostname]["refreshing"] = True
         return data
 
-    def sites(**kwargs):
+    @classmethod
+    def inventory_refresh(cls, kind, pk):
         """
-        Cisco DNA Center Sites Devices
+        Fetch the Inventory (`devices` or `sites`) of a Cisco DNA Center
         """
+        hostname = get_object_or_404(Settings, pk=pk).hostname
+        try:
+            tenants = CiscoDNAC(pk=pk)
+            if hostname not in tenants.dnac:
+                raise Exception(tenants.dnac_status.get(hostname, "not reachable"))
+            funcs = {"devices": tenants.devices, "sites": tenants.sites}
+            items = tenants.fetch(**{kind: funcs[kind]})[hostname][kind]
+            rows = {"devices": cls.devices_rows, "sites": cls.sites_rows}
+            return cls.inventory_store(kind, hostname, rows[kind](items))
+        except Exception as error_msg:
+            # Keep the last Inventory of an unreachable Cisco DNA Center
+            print("Error for {}: {}".format(hostname, error_msg))
+            return cls.inventory_store(kind, hostname, None, error=error_msg)
+        finally:
+            cache.delete(cls.inventory_key(kind, hostname, "bg"))
 
-        # Gather all sites from Cisco DNA Center Network Designs (no sync)
-        data = {}
-        tenants = CiscoDNAC(**kwargs)
-        for tenant, dnac in tenants.dnac.items():
-            results = []
-            for site in tenants.sites(tenant=dnac):
+    @classmethod
+    def inventory_store(cls, kind, hostname, rows, error=None):
+        """
+        Cache the Inventory of a Cisco DNA Center, served stale while refreshed
 
-                # Get addtional data about the location
-                if len(site.additionalInfo) != 0:
-                    for additionalInfo in site.additionalInfo:
-                        if "Location" in additionalInfo["nameSpace"]:
-                            result = {
-                                "name": site.name,
-                                "siteNameHierarchy": site.siteNameHierarchy,
-                                "type": additionalInfo["attributes"]["type"],
-                                "country": additionalInfo["attributes"]["country"],
-                            }
-                else:
-                    result = {
-                        "name": site.name,
-                        "siteNameHierarchy": site.siteNameHierarchy,
-                        "type": None,
-                        "country": None,
-                    }
-                results.append(result)
-            results = sorted(
-                results, key=lambda k: k["siteNameHierarchy"], reverse=False
+        Only the rows of the page are cached (see `devices_rows` and
+        `sites_rows`), not the API objects.
+        """
+        key = cls.inventory_key(kind, hostname)
+        if error is None:
+            entry = {"timestamp": timezone.now(), "items": rows, "error": None}
+        else:
+            entry = cache.get(key) or {"timestamp": None, "items": []}
+            entry["error"] = str(error)
+        cache.set(key, entry, timeout=2 * System.Config.get("inventory_ttl"))
+        return entry
+
+    @staticmethod
+    def run_start(kind, job_id=None):
+        """
+        Start a Sync Run
+        """
+        return SyncRun.objects.create(kind=kind, job_id=job_id)
+
+    @staticmethod
+    def run_cleanup():
+        """
+        Remove the Sync Runs older than `run_retention` days (with their Records)
+        """
+        SyncRun.objects.filter(
+            created__lt=timezone.now()
+            - timedelta(days=System.Config.get("run_retention"))
+        ).delete()
+
+    @staticmethod
+    def run_finish(run, counters, status="finished"):
+        """
+        Complete a Sync Run with the counters per Tenant
+        """
+        if run is None:
+            return
+        SyncRun.objects.filter(pk=run).update(
+            status=status, completed=timezone.now(), counters=counters
+        )
+
+        # Expired Sync Runs, once an hour (with or without the scheduler)
+        if cache.add("ciscodnacnetbox_run_cleanup", True, timeout=3600):
+            Data.run_cleanup()
+
+    @staticmethod
+    def record(run, tenant, stage, results):
+        """
+        Store the result of every changed Site or Device of a Sync Run
+
+        Only plain values are kept (e.g. the name of the NetBox Site),
+        one row per created, updated, deleted or failed object. Returns
+        the number of unchanged objects, kept as a counter of the Run.
+        """
+        unchanged = 0
+        records = []
+        for result in results:
+            if result.get("sync_status") == "Unchanged":
+                unchanged += 1
+                continue
+            key = result.get("slug") or result.get("serial") or result.get("key")
+            records.append(
+                SyncRecord(
+                    run_id=run,
+                    tenant=tenant or "",
+                    type=stage.rstrip("s"),
+                    key=str(key or "")[0:100],
+                    name=str(result.get("name") or "")[0:100],
+                    status=str(result.get("status") or "")[0:50],
+                    status_label=str(result.get("status_label") or "")[0:10],
+                    sync_status=str(result.get("sync_status") or "")[0:200],
+                )
             )
-            data[tenant] = results
-        return data
+        if run is not None:
+            SyncRecord.objects.bulk_create(
+                records, batch_size=System.Config.get("bulk_batch_size")
+            )
+        return unchanged
+
+    @classmethod
+    def sync_run(cls, stage, **kwargs):
+        """
+        Sync Sites or Devices in the request and record it as a Sync Run
+        """
+        run = cls.run_start(stage)
+        report = {}
+        purged = {}
+        try:
+            if stage == "sites":
+                data = cls.sync_sites(report=report, purged=purged, **kwargs)
+            else:
+                data = cls.sync_devices(report=report, purged=purged, **kwargs)
+        except Exception:
+            cls.run_finish(run.pk, {}, status="failed")
+            raise
+        counters = {}
+        for tenant, results in data.items():
+            counters[tenant] = {
+                stage: len(results),
+                stage + "_unchanged": cls.record(run.pk, tenant, stage, results),
+                **report.get(tenant, {}),
+            }
+            cls.record(run.pk, tenant, stage, purged.get(tenant, []))
+        cls.run_finish(run.pk, counters)
+        return run
+
+    @staticmethod
+    def run_update(run, tenant, result):
+        """
+        Add the counters and Metrics of a stage to a running Sync Run
+        """
+        if run is None:
+            return
+        # Stages of other Tenants finish at the same time
+        with transaction.atomic():
+            __obj = SyncRun.objects.select_for_update().filter(pk=run).first()
+            if __obj is None:
+                return
+            counters = __obj.counters.setdefault(tenant, {})
+            result = dict(result)
+            counters.setdefault("metrics", {}).update(result.pop("metrics", {}))
+            counters.update(result)
+            SyncRun.objects.filter(pk=run).update(counters=__obj.counters)
+
+    @staticmethod
+    def inventory_key(kind, hostname, suffix=None):
+        key = "ciscodnacnetbox_inventory_{}_{}".format(kind, hostname)
+        if suffix is not None:
+            key = "{}_{}".format(key, suffix)
+        return key
 
     @classmethod
     def sync_full(cls, **kwargs):
@@ -152,214 +548,947 @@ class Data:
             return data.result
 
         # Check if ongoing RQ Job is ongoing
-        job = cache.get("ciscodnacnetbox_bg")
-        if job is None:
-            # If not, start full sync task
-            job = full_sync.delay(**kwargs)
-            cache.set("ciscodnacnetbox_bg", job.id, timeout=600)
-
-        # Get Job Status
-        j = queue.fetch_job(cache.get("ciscodnacnetbox_bg"))
-        job_done = ["finished", "failed"]
-        if "finished" == j.get_status():
-            # Start again, if cache expired
-            job = full_sync.delay(**kwargs)
-            cache.set("ciscodnacnetbox_bg", job.id, timeout=600)
-        if j.get_status() in job_done:
-            # Start again, if cache expired
-            job = full_sync.delay(**kwargs)
-            cache.set("ciscodnacnetbox_bg", job.id, timeout=600)
+        j = None
+        if cache.get("ciscodnacnetbox_bg") is not None:
+            j = queue.fetch_job(cache.get("ciscodnacnetbox_bg"))
+
+        # If not, start full sync task
+        if j is None or j.get_status() in ["finished", "failed"]:
+            j = cls.sync_enqueue(**kwargs)
+            cache.set(
+                "ciscodnacnetbox_bg", j.id, timeout=System.Config.get("sync_timeout")
+            )
         data["id"] = str(j.id)
         data["task"] = str(j.func_name)
         return data
 
+    @staticmethod
+    def sync_plan(**kwargs):
+        """
+        Plan a Sync of Cisco DNA Center as RQ job
+        """
+        queue = get_queue("default")
+
+        # Get RQ Job ID and display results
+        if "id" in kwargs:
+            j = queue.fetch_job(str(kwargs["id"]))
+            if j is None:
+                return None
+            return j.result
+
+        # Nothing is written, so no lock is needed
+        j = queue.enqueue_call(
+            plan_sync, kwargs=kwargs, timeout=System.Config.get("sync_timeout")
+        )
+        return {"id": str(j.id), "task": str(j.func_name)}
+
+    @staticmethod
+    def schedule():
+        """
+        Start the Scheduler, unless it's running or no Sync is scheduled
+        """
+        if Scheduler.running():
+            return
+        if Settings.objects.filter(status=True, sync_interval__gt=0).exists():
+            if System.RQ.status():
+                Scheduler.alive()
+                schedule_sync.delay()
+
+    @staticmethod
+    def sync_enqueue(**kwargs):
+        """
+        Queue one RQ job per Tenant and stage, collected by `full_sync`
+        """
+        queue = get_queue("default")
+        timeout = System.Config.get("sync_timeout")
+        jobs = {}
+        locked = []
+        depends_on = []
+
+        # Progress of every stage is published for the `full_sync` job
+        id = str(uuid.uuid4())
+        run = Data.run_start("full", job_id=id)
+
+        tenants = Settings.objects.filter(status=True)
+        if "pk" in kwargs and isinstance(kwargs["pk"], int) is True:
+            tenants = tenants.filter(pk=kwargs["pk"])
+        for tenant in tenants:
+
+            # Only one Sync per Tenant at the time, released by the devices stage
+            lock = "ciscodnacnetbox_lock_{}".format(tenant.pk)
+            if cache.add(lock, True, timeout=timeout) is False:
+                locked.append(tenant.hostname)
+                continue
+
+            # Devices are assigned to Sites, so Sites are synced first
+            params = {
+                "pk": tenant.pk,
+                "tenant": tenant.hostname,
+                "reconcile": kwargs.get("reconcile", False),
+                "progress": id,
+                "run": run.pk,
+            }
+            # Results are kept until `full_sync` runs, after the slowest Tenant
+            sites = queue.enqueue_call(
+                sync_tenant,
+                kwargs={"stage": "sites", **params},
+                timeout=timeout,
+                result_ttl=timeout,
+            )
+            devices = queue.enqueue_call(
+                sync_tenant,
+                kwargs={"stage": "devices", **params},
+                depends_on=sites,
+                timeout=timeout,
+                result_ttl=timeout,
+            )
+            jobs[tenant.hostname] = [sites.id, devices.id]
+            depends_on.append(devices)
+
+        # Collect the results when every Tenant is done
+        return queue.enqueue_call(
+            full_sync,
+            kwargs={"jobs": jobs, "locked": locked, "run": run.pk},
+            depends_on=depends_on or None,
+            timeout=timeout,
+            job_id=id,
+        )
+
     @classmethod
     def sync_sites(cls, **kwargs):
         """
         Sync Cisco DNA Center Sites
+
+        With `dry_run` nothing is written and the planned operations are
+        returned per Tenant instead of the sync results.
         """
 
         # Sync mandatory tag for Cisco DNA Center in NetBox
-        dnac_tag = Netbox.Sync.tags(task="system")
+        dry_run = kwargs.get("dry_run", False)
+        dnac_tag = cls.tag(dry_run)
+        incremental = cls.incremental(**kwargs)
+        report = kwargs.get("report", {})
+        purged = kwargs.get("purged", {})
+        metrics = kwargs.get("metrics", Metrics())
+        progress = kwargs.get("progress", Progress())
 
         # Gather all sites in Cisco DNA Center Network Designs
         data = {}
-        tenants = CiscoDNAC(**kwargs)
-        for tenant, dnac in tenants.dnac.items():
+        with metrics.stage("auth"):
+            tenants = CiscoDNAC(**kwargs)
+        with metrics.stage("fetch"):
+            fetched = tenants.fetch(sites=tenants.sites)
+        for tenant, dnac in fetched.items():
             results = []
-            # Sync Cisco DNA Center Tenant
-            Netbox.Sync.tenants(
-                task="system", tenant=tenant, slug=tenant.replace(".", "-")
-            )
-            # Add tag to Cisco DNA Center Tenant
-            Netbox.Sync.tags(
-                task="update",
-                model="tenant",
-                filter=tenant,
-                tag=dnac_tag,
-            )
-            for site in tenants.sites(tenant=dnac):
-                # Sync Site
-                # Unique name for `Global` as it can't be duplicate in NetBox
-                if site.siteNameHierarchy == "Global":
-                    suffix = site.id.split("-")
-                    site.siteNameHierarchy = "{} {}".format(
-                        site.siteNameHierarchy, suffix[0]
+            cls.inventory_store("sites", tenant, cls.sites_rows(dnac["sites"]))
+            progress.update(tenant, "sites", "fetch", total=len(dnac["sites"]))
+
+            # All or nothing per Tenant
+            with transaction.atomic():
+                with metrics.stage("plan"):
+                    # Sync Cisco DNA Center Tenant
+                    context = Netbox.Context(
+                        tenant=cls.tenant(tenant, dry_run), tag=dnac_tag
                     )
+                    # Add tag to Cisco DNA Center Tenant
+                    Netbox.Sync.tags(task="update", context=context, obj=context.tenant)
 
-                # Use Cisco DNA Center UUID for Site as Slug
-                site.slug = site.id
-                site.sync = Netbox.Sync.site(tenant=tenant, site=site)
+                # Areas, buildings and floors as Regions, Sites and Locations
+                if context.hierarchy:
+                    data[tenant] = cls.sync_hierarchy(
+                        context=context, sites=dnac["sites"], **kwargs
+                    )
+                    continue
 
-                # Add tag to Site
-                Netbox.Sync.tags(
-                    task="update",
-                    model="site",
-                    filter=site.siteNameHierarchy,
-                    tag=dnac_tag,
-                )
+                with metrics.stage("plan"):
+                    digests = {}
+                    plan = {}
+                    pending = []
+                    for site in dnac["sites"]:
+                        cls.site_prepare(site)
+
+                    # Sites of other Tenants with the same names, in one query
+                    context.prefetch_sites(
+                        [site.siteNameHierarchy[0:100] for site in dnac["sites"]]
+                    )
+                    for site in dnac["sites"]:
+                        # Skip Site if nothing changed since the last sync
+                        unchanged = (
+                            incremental
+                            and site.slug in context.sites
+                            and context.unchanged("site", site.slug, site.digest)
+                        )
+
+                        # Otherwise plan the Site, only Sites that differ are written
+                        if unchanged is False:
+                            site.plan = Netbox.Plan.site(context=context, site=site)
+                            if site.plan is not None:
+                                plan[("site", site.slug)] = site.plan
+                            unchanged = incremental and site.plan is None
+                        if unchanged:
+                            digests[site.slug] = site.digest
+                            result = {
+                                "name": site.name,
+                                "status": site.status,
+                                "status_label": site.status_label,
+                                "slug": site.slug,
+                                "sync_status": "Unchanged",
+                            }
+                            results.append(result)
+                            continue
+                        pending.append(site)
 
-                site.status = "Active"
-                site.status_label = "success"
-                result = {
-                    "name": site.name,
-                    "status": site.status,
-                    "status_label": site.status_label,
-                    "slug": site.slug,
-                    "sync_status": site.sync[1],
-                }
-                results.append(result)
-
-            # If site is removed in Cisco DNA Center, then remove in NetBox
-            Netbox.Purge.database(tenant=tenant, type="sites", data=results)
+                # Return the plan, including the Sites removed in Cisco DNA Center
+                if dry_run:
+                    data[tenant] = list(plan.values()) + Netbox.Plan.purge(
+                        context=context,
+                        type="sites",
+                        keys=[site.slug for site in dnac["sites"]],
+                    )
+                    continue
+
+                # Sync Sites in batches, a bad Site is reported and skipped
+                with metrics.stage("writes"):
+                    for site, sync_status, error_msg in cls.savepoints(
+                        context,
+                        pending,
+                        cls.sync_sites_batch,
+                        progress=lambda done: progress.update(
+                            tenant, "sites", "writes", done=done, total=len(pending)
+                        ),
+                    ):
+                        if error_msg is None:
+                            digests[site.slug] = site.digest
+                        else:
+                            sync_status = "Error: {}".format(error_msg)
+                        result = {
+                            "name": site.name,
+                            "status": site.status,
+                            "status_label": site.status_label,
+                            "slug": site.slug,
+                            "sync_status": sync_status,
+                        }
+                        results.append(result)
+                    Netbox.Sync.tags(task="bulk", context=context)
+                    Netbox.Sync.fingerprints(
+                        context=context, type="site", digests=digests
+                    )
+
+                # If site is removed in Cisco DNA Center, then remove in NetBox
+                with metrics.stage("purge"):
+                    deleted = Netbox.Purge.database(
+                        context=context, type="sites", data=results
+                    )
+                report.setdefault(tenant, {})["sites_deleted"] = len(deleted)
+                purged.setdefault(tenant, []).extend(deleted)
             results = sorted(results, key=lambda k: k["name"], reverse=False)
             data[tenant] = results
         return data
 
+    @classmethod
+    def sync_hierarchy(cls, context, sites, **kwargs):
+        """
+        Sync the Sites of a Cisco DNA Center as Regions (areas), Sites
+        (buildings) and Locations (floors), with `site_hierarchy`
+
+        The tree is built once and written level by level in bulk, so that
+        no Site is looked up on its own. With `dry_run` the planned
+        operations are returned instead of the sync results.
+        """
+        tenant = context.name
+        report = kwargs.get("report", {})
+        purged = kwargs.get("purged", {})
+        metrics = kwargs.get("metrics", Metrics())
+        progress = kwargs.get("progress", Progress())
+
+        with metrics.stage("plan"):
+            for site in sites:
+                cls.site_prepare(site)
+            tree = Hierarchy(sites)
+
+        # Return the plan, including the objects removed in Cisco DNA Center
+        if kwargs.get("dry_run", False):
+            with metrics.stage("plan"):
+                plan = Netbox.Plan.hierarchy(context=context, tree=tree)
+                for type, level in [
+                    ("locations", tree.locations),
+                    ("sites", tree.sites),
+                    ("regions", tree.regions),
+                ]:
+                    plan += Netbox.Plan.purge(
+                        context=context,
+                        type=type,
+                        keys=[site.slug for site in level],
+                    )
+            return plan
+
+        results = []
+        with metrics.stage("writes"):
+            synced = Netbox.Sync.hierarchy(context=context, tree=tree)
+            digests = {}
+            for site in tree.regions + tree.sites + tree.locations:
+                __obj, sync_status = synced[site.slug]
+                if not sync_status.startswith("Error"):
+                    Netbox.Sync.tags(task="update", context=context, obj=__obj)
+                    if site.type == "building":
+                        digests[site.slug] = site.digest
+                results.append(
+                    {
+                        "name": site.name,
+                        "status": site.status,
+                        "status_label": site.status_label,
+                        "slug": site.slug,
+                        "sync_status": sync_status,
+                    }
+                )
+            for site in tree.skipped:
+                results.append(
+                    {
+                        "name": site.name,
+                        "status": site.status,
+                        "status_label": site.status_label,
+                        "slug": site.slug,
+                        "sync_status": "Error: No area, building or floor",
+                    }
+                )
+            progress.update(
+                tenant, "sites", "writes", done=len(results), total=len(sites)
+            )
+            Netbox.Sync.tags(task="bulk", context=context)
+            Netbox.Sync.fingerprints(context=context, type="site", digests=digests)
+
+        # If an area, building or floor is removed in Cisco DNA Center, then remove in NetBox
+        with metrics.stage("purge"):
+            deleted = []
+            for type in ["locations", "sites", "regions"]:
+                deleted += Netbox.Purge.database(
+                    context=context, type=type, data=results
+                )
+        report.setdefault(tenant, {})["sites_deleted"] = len(deleted)
+        purged.setdefault(tenant, []).extend(deleted)
+        return sorted(results, key=lambda k: k["name"], reverse=False)
+
+    @staticmethod
+    def event_enqueue(pk, kind, key):
+        """
+        Queue the Sync of the Device or Site of an event
+
+        Events for the same object are coalesced while the job is queued.
+        """
+        if cache.add(
+            "ciscodnacnetbox_event_{}_{}_{}".format(pk, kind, key),
+            True,
+            timeout=System.Config.get("sync_timeout"),
+        ):
+            sync_event.delay(pk, kind, key)
+            return True
+        return False
+
+    @classmethod
+    def sync_event(cls, pk, kind, key):
+        """
+        Sync a single Device or Site of a Cisco DNA Center (event)
+
+        `key` is the UUID, serial number, management IP or hostname of a
+        Device, or the UUID of a Site. Objects that no longer exist in
+        Cisco DNA Center are removed from NetBox.
+        """
+        dnac_tag = cls.tag()
+        tenants = CiscoDNAC(pk=pk)
+        for tenant, dnac in tenants.dnac.items():
+            context = Netbox.Context(tenant=cls.tenant(tenant), tag=dnac_tag)
+
+            # Cisco DNA Center first, the transaction only covers NetBox
+            if kind == "site":
+                sites = tenants.sites(dnac)
+            else:
+                devices, site_members = cls.event_devices(context, tenants, dnac, key)
+            with transaction.atomic():
+                if kind == "site":
+                    result = cls.sync_event_site(context, key, sites)
+                else:
+                    result = cls.sync_event_device(context, key, devices, site_members)
+                Netbox.Sync.tags(task="bulk", context=context)
+            return result
+        return {"sync_status": "Error: Cisco DNA Center not reachable"}
+
+    @classmethod
+    def sync_event_site(cls, context, key, sites):
+        """
+        Sync a single Site, removed if no longer in Cisco DNA Center
+        """
+        site = next((s for s in sites if s.id == key), None)
+        if site is None:
+            models = [Site]
+            if context.hierarchy:
+                models = [Location, Site, Region]
+            try:
+                with transaction.atomic():
+                    deleted = 0
+                    for model in models:
+                        deleted += (
+                            context.managed(model).filter(slug=key[0:100]).delete()[0]
+                        )
+            except Exception as error_msg:
+                return {"slug": key, "sync_status": "Error: {}".format(error_msg)}
+            Netbox.Sync.fingerprint(context=context, type="site", key=key[0:100])
+            return {"slug": key, "sync_status": "Deleted" if deleted else "Unchanged"}
+
+        # The Site and its parents, as Regions, Sites and Locations
+        if context.hierarchy:
+            path = Hierarchy(sites).path(site)
+            for node in path:
+                cls.site_prepare(node)
+            tree = Hierarchy(path)
+            __obj = None
+            try:
+                with transaction.atomic():
+                    __obj, sync_status = Netbox.Sync.hierarchy(
+                        context=context, tree=tree
+                    ).get(site.slug, (None, "Error: No area, building or floor"))
+            except Exception as error_msg:
+                context.reset()
+                sync_status = "Error: {}".format(error_msg)
+            if __obj is not None and not sync_status.startswith("Error"):
+                Netbox.Sync.tags(task="update", context=context, obj=__obj)
+                if site.type == "building":
+                    Netbox.Sync.fingerprint(
+                        context=context, type="site", key=site.slug, digest=site.digest
+                    )
+            return {"name": site.name, "slug": site.slug, "sync_status": sync_status}
+
+        cls.site_prepare(site)
+        context.prefetch_sites([site.siteNameHierarchy[0:100]])
+        for site, sync_status, error_msg in cls.savepoints(
+            context, [site], cls.sync_sites_batch
+        ):
+            if error_msg is not None:
+                sync_status = "Error: {}".format(error_msg)
+            else:
+                Netbox.Sync.fingerprint(
+                    context=context, type="site", key=site.slug, digest=site.digest
+                )
+        return {"name": site.name, "slug": site.slug, "sync_status": sync_status}
+
+    @classmethod
+    def event_devices(cls, context, tenants, dnac, key):
+        """
+        Devices of an event in Cisco DNA Center, and the Site of the first
+        """
+        lookup = Events.lookup(key)
+        if lookup is not None:
+            devices = dnac.devices.get_device_list(**{lookup: key}).response
+        else:
+            devices = dnac.devices.get_device_list(serial_number=key).response
+            if len(devices) == 0:
+                devices = dnac.devices.get_device_list(hostname=key).response
+        devices = [d for d in devices if d.deviceSupportLevel == "Supported"]
+        if len(devices) == 0:
+            return devices, {}
+
+        # The membership is refreshed if the Device is unknown
+        site_members = tenants.devices_to_sites(
+            tenant=dnac, sites=cls.site_ids(context), devices=[devices[0].serialNumber]
+        )
+        return devices, site_members
+
+    @classmethod
+    def sync_event_device(cls, context, key, devices, site_members):
+        """
+        Sync a single Device, removed if no longer in Cisco DNA Center
+        """
+        # Removed from Cisco DNA Center, find the Device in NetBox
+        if len(devices) == 0:
+            serials = [
+                context.primary_ips.get(ip.pk)
+                for address, ip in context.ipaddresses.items()
+                if address.split("/")[0] == key
+            ]
+            for device in context.devices.values():
+                if key in [device.serial, device.name] or device.serial in serials:
+                    Device.objects.filter(pk=device.pk).delete()
+                    Netbox.Sync.fingerprint(
+                        context=context, type="device", key=device.serial
+                    )
+                    return {"name": device.name, "sync_status": "Deleted"}
+            return {"name": key, "sync_status": "Error: Device not found"}
+
+        # Site of the Device
+        device = devices[0]
+        cls.device_prepare(device)
+        if device.serialNumber not in site_members:
+            return {"name": device.hostname, "sync_status": "Error: Site not found"}
+        device.digest = cls.device_digest(
+            device, cls.device_site(context, device, site_members[device.serialNumber])
+        )
+
+        for device, sync_status, error_msg in cls.savepoints(
+            context, [device], cls.sync_devices_batch
+        ):
+            if error_msg is not None:
+                sync_status = "Error: {}".format(error_msg)
+            elif sync_status != "Error":
+                Netbox.Sync.fingerprint(
+                    context=context,
+                    type="device",
+                    key=device.serialNumber[0:50],
+                    digest=device.digest,
+                )
+        return {"name": device.hostname, "sync_status": sync_status}
+
+    @staticmethod
+    def site_prepare(site):
+        """
+        Slug, status and Fingerprint of a Cisco DNA Center Site
+        """
+        # Unique name for `Global` as it can't be duplicate in NetBox
+        if site.siteNameHierarchy == "Global":
+            suffix = site.id.split("-")
+            site.siteNameHierarchy = "{} {}".format(site.siteNameHierarchy, suffix[0])
+
+        # Use Cisco DNA Center UUID for Site as Slug
+        site.slug = site.id[0:100]
+        site.status = "Active"
+        site.status_label = "success"
+        site.digest = System.Fingerprint.create(
+            site.siteNameHierarchy, site.additionalInfo
+        )
+
+    @staticmethod
+    def device_prepare(device):
+        """
+        Status of a Cisco DNA Center Device, based on its reachability
+        """
+        if device.reachabilityStatus == "Reachable":
+            device.status = DeviceStatusChoices.STATUS_ACTIVE
+            device.status_label = "success"
+        else:
+            device.status = DeviceStatusChoices.STATUS_FAILED
+            device.status_label = "danger"
+
+    @staticmethod
+    def device_digest(device, site_id):
+        """
+        Fingerprint of a Cisco DNA Center Device
+        """
+        return System.Fingerprint.create(
+            device.hostname,
+            device.type,
+            device.family,
+            device.role,
+            device.managementIpAddress,
+            device.reachabilityStatus,
+            site_id,
+        )
+
+    @staticmethod
+    def site_ids(context):
+        """
+        Site UUIDs of the Device membership, parents before children
+
+        With `site_hierarchy` the floors (Locations) follow the buildings.
+        """
+        site_ids = [
+            site.slug
+            for site in sorted(context.sites.values(), key=lambda k: len(k.name))
+        ]
+        if context.hierarchy:
+            site_ids += [location.slug for location in context.locations.values()]
+        return site_ids
+
+    @staticmethod
+    def device_site(context, device, site_id):
+        """
+        Site of a Device, and its Location (floor) with `site_hierarchy`
+
+        Returns the placement of the Device for its Fingerprint.
+        """
+        if not context.hierarchy:
+            device.site = context.sites[site_id]
+            return site_id
+        device.location = context.locations.get(site_id)
+        if device.location is not None:
+            device.site = device.location.site
+        else:
+            device.site = context.sites[site_id]
+        return [device.site.slug, getattr(device.location, "slug", None)]
+
+    @staticmethod
+    def sync_sites_batch(context, sites):
+        """
+        Sync a batch of Cisco DNA Center Sites
+        """
+        results = []
+        for site in sites:
+            site.sync = Netbox.Sync.site(context=context, site=site)
+
+            # Add tag to Site
+            Netbox.Sync.tags(task="update", context=context, obj=site.sync[0])
+            results.append(site.sync[1])
+        return results
+
     @classmethod
     def sync_devices(cls, **kwargs):
         """
         Sync Cisco DNA Center Devices
+
+        With `dry_run` nothing is written and the planned operations are
+        returned per Tenant instead of the sync results.
+
+        Pages are fetched outside of any transaction, only the writes of a
+        batch (`commit_batch_size`) are committed together, so no database
+        transaction is held open during Cisco DNA Center API calls.
         """
 
         # Sync mandatory tag for Cisco DNA Center
-        dnac_tag = Netbox.Sync.tags(task="system")
+        dry_run = kwargs.get("dry_run", False)
+        dnac_tag = cls.tag(dry_run)
+        incremental = cls.incremental(**kwargs)
+        report = kwargs.get("report", {})
+        purged = kwargs.get("purged", {})
+        metrics = kwargs.get("metrics", Metrics())
+        progress = kwargs.get("progress", Progress())
 
         # Gather all devices in Cisco DNA Center Inventory
         data = {}
-        tenants = CiscoDNAC(**kwargs)
+        with metrics.stage("auth"):
+            tenants = CiscoDNAC(**kwargs)
         for tenant, dnac in tenants.dnac.items():
             results = []
 
             # NetBox sites mandatory to assign sites
-            if System.Check.sites(tenant=tenant) is False:
+            if dry_run is False and System.Check.sites(tenant=tenant) is False:
                 data[tenant] = [{"sync_status": "Error: Sync sites first"}]
                 continue
-            # Map Devices (Serial) against Site UUID
-            site_members = CiscoDNAC.devices_to_sites(tenant=dnac)
-
-            # Get devices from Cisco DNA Center
-            for device in tenants.devices(tenant=dnac):
 
+            with metrics.stage("plan"):
                 # Sync Cisco DNA Center Tenant
-                Netbox.Sync.tenants(
-                    task="system", tenant=tenant, slug=tenant.replace(".", "-")
+                context = Netbox.Context(
+                    tenant=cls.tenant(tenant, dry_run), tag=dnac_tag
                 )
-                Netbox.Sync.tags(
-                    task="update",
-                    model="tenant",
-                    filter=tenant,
-                    tag=dnac_tag,
+                Netbox.Sync.tags(task="update", context=context, obj=context.tenant)
+
+                # Map Devices (Serial) against Site UUID, using the synced Sites
+                site_ids = cls.site_ids(context)
+            # Reconcile and plans don't trust the cached membership
+            refreshed = dry_run or incremental is False
+            with metrics.stage("membership"):
+                site_members = tenants.devices_to_sites(
+                    tenant=dnac, sites=site_ids, refresh=refreshed
+                )
+            digests = {}
+            plan = {}
+            serials = []
+            inventory = []
+
+            # Number of Devices, only for the progress
+            total = None
+            if progress.enabled:
+                total = tenants.devices_count(tenant=dnac)
+
+            # Get devices from Cisco DNA Center, one page at a time
+            pages = tenants.device_pages(tenant=dnac)
+            for page in metrics.iterate("fetch", pages):
+                pending = []
+                # Rows of the Devices page, before the Devices are changed
+                inventory.extend(cls.devices_rows(page))
+                progress.update(
+                    tenant, "devices", "fetch", done=len(inventory), total=total
                 )
 
                 # Check that the device is supported in Cisco DNA Center
-                if device.deviceSupportLevel == "Supported":
+                supported = [
+                    device
+                    for device in page
+                    if device.deviceSupportLevel == "Supported"
+                ]
 
-                    # Sync Manufacture
-                    device.manufacture = device.type.split()[0]
-                    device.manufacture = Netbox.Sync.manufacturer(
-                        manufacture=device.manufacture, tenant=tenant
-                    )
+                # Refresh Site membership once, if there are unknown Devices
+                missing = [
+                    device.serialNumber
+                    for device in supported
+                    if device.serialNumber not in site_members
+                ]
+                with metrics.stage("membership"):
+                    if len(missing) != 0 and refreshed is False:
+                        site_members = tenants.devices_to_sites(
+                            tenant=dnac, sites=site_ids, devices=missing
+                        )
+                        refreshed = True
 
-                    # Sync Device Types
-                    slug = System.Slug.create(device.family)
-                    device.family_type = Netbox.Sync.devicetype(
-                        manufacture=device.manufacture,
-                        model=device.family,
-                        slug=slug,
-                        tenant=tenant,
-                    )
-                    # Add tag to devicetype
-                    Netbox.Sync.tags(
-                        task="update",
-                        model="devicetype",
-                        filter=slug,
-                        tag=dnac_tag,
-                    )
+                with metrics.stage("plan"):
+                    for device in supported:
 
-                    # Sync Device Roles
-                    slug = System.Slug.create(device.role)
-                    device.role = Netbox.Sync.devicerole(
-                        role=device.role, slug=slug, tenant=tenant
-                    )
+                        # Check if devices is reachable from Cisco DNA Center
+                        cls.device_prepare(device)
 
-                    # Sync Device IP Address
-                    device.primary_ip4 = Netbox.Sync.ipaddress(
-                        tenant=tenant,
-                        address=device.managementIpAddress,
-                        hostname=device.hostname,
-                    )
-                    # Add tags to IP Address
-                    Netbox.Sync.tags(
-                        task="update",
-                        model="ipaddress",
-                        filter=device.primary_ip4,
-                        tag=dnac_tag,
-                        tenant=tenant,
-                    )
-                    # Device Site Location
-                    device.site = Site.objects.get(
-                        slug=site_members[device.serialNumber],
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    )
+                        # Device must be assigned to a Site in Cisco DNA Center
+                        serial = device.serialNumber[0:50]
+                        serials.append(serial)
+                        if device.serialNumber not in site_members:
+                            plan[("device", serial)] = {
+                                "model": "device",
+                                "action": "skip",
+                                "key": serial,
+                                "changes": {"sync_status": "Site not found"},
+                            }
+                            result = {
+                                "name": device.hostname,
+                                "status": device.status,
+                                "status_label": device.status_label,
+                                "serial": device.serialNumber,
+                                "sync_status": "Error: Site not found",
+                            }
+                            results.append(result)
+                            continue
+                        placement = cls.device_site(
+                            context, device, site_members[device.serialNumber]
+                        )
+
+                        # Skip Device if nothing changed since the last sync
+                        device.digest = cls.device_digest(device, placement)
+                        unchanged = (
+                            incremental
+                            and serial in context.devices
+                            and context.unchanged("device", serial, device.digest)
+                        )
+
+                        # Otherwise plan the Device and its related objects
+                        if unchanged is False:
+                            device.plan = Netbox.Plan.device(
+                                context=context, device=device
+                            )
+                            for operation in device.plan:
+                                plan[(operation["model"], operation["key"])] = operation
+                            unchanged = incremental and len(device.plan) == 0
+                        if unchanged:
+                            digests[serial] = device.digest
+                            result = {
+                                "name": device.hostname,
+                                "status": device.status,
+                                "status_label": device.status_label,
+                                "role": device.role,
+                                "type": device.family,
+                                "site": device.site,
+                                "primary_ip4": device.managementIpAddress,
+                                "serial": serial,
+                                "sync_status": "Unchanged",
+                            }
+                            results.append(result)
+                            continue
+                        pending.append(device)
+
+                # Only plan on a dry run
+                if dry_run:
+                    continue
+
+                # Sync Devices in batches, a bad Device is reported and skipped
+                with metrics.stage("writes"):
+                    for device, sync_status, error_msg in cls.savepoints(
+                        context,
+                        pending,
+                        cls.sync_devices_batch,
+                        progress=lambda done: progress.update(
+                            tenant,
+                            "devices",
+                            "writes",
+                            done=len(results) + done,
+                            total=total,
+                        ),
+                    ):
+                        if error_msg is not None:
+                            result = {
+                                "name": device.hostname,
+                                "status": device.status,
+                                "status_label": device.status_label,
+                                "role": device.role,
+                                "type": device.family,
+                                "site": device.site,
+                                "primary_ip4": device.managementIpAddress,
+                                "serial": device.serialNumber,
+                                "sync_status": "Error: {}".format(error_msg),
+                            }
+                            results.append(result)
+                            continue
+                        result = {
+                            "name": device.hostname,
+                            "status": device.status,
+                            "status_label": device.status_label,
+                            "role": device.device_role,
+                            "type": device.family_type,
+                            "site": device.site,
+                            "primary_ip4": device.primary_ip4,
+                            "serial": device.serialNumber,
+                            "sync_status": sync_status,
+                        }
+                        results.append(result)
+                        if sync_status != "Error":
+                            digests[device.serialNumber] = device.digest
+
+                    # Tag the Devices of the page
+                    with transaction.atomic():
+                        Netbox.Sync.tags(task="bulk", context=context)
+
+            # Complete Inventory for the Devices page
+            cls.inventory_store("devices", tenant, inventory)
 
-                    # Check if devices is reachable from Cisco DNA Center
-                    if device.reachabilityStatus == "Reachable":
-                        device.status = DeviceStatusChoices.STATUS_ACTIVE
-                        device.status_label = "success"
-                    else:
-                        device.status = DeviceStatusChoices.STATUS_FAILED
-                        device.status_label = "danger"
-
-                    # Sync Device and get status
-                    sync_status = Netbox.Sync.device(tenant=tenant, device=device)
-                    # Add tag to device
-                    Netbox.Sync.tags(
-                        task="update",
-                        model="device",
-                        filter=device.serialNumber,
-                        tag=dnac_tag,
+            # Return the plan, including the Devices removed in Cisco DNA Center
+            if dry_run:
+                data[tenant] = list(plan.values()) + Netbox.Plan.purge(
+                    context=context, type="devices", keys=serials
+                )
+                continue
+            with transaction.atomic():
+                with metrics.stage("writes"):
+                    Netbox.Sync.fingerprints(
+                        context=context, type="device", digests=digests
                     )
-                    result = {
-                        "name": device.hostname,
-                        "status": device.status,
-                        "status_label": device.status_label,
-                        "role": device.role,
-                        "type": device.family_type,
-                        "site": device.site,
-                        "primary_ip4": device.primary_ip4,
-                        "serial": device.serialNumber,
-                        "sync_status": sync_status[1],
-                    }
-                    results.append(result)
 
-            # If device is removed in Cisco DNA Center, then remove in NetBox
-            Netbox.Purge.database(tenant=tenant, type="devices", data=results)
+                # If device is removed in Cisco DNA Center, then remove in NetBox
+                with metrics.stage("purge"):
+                    deleted = Netbox.Purge.database(
+                        context=context, type="devices", data=results
+                    )
+            report.setdefault(tenant, {})["devices_deleted"] = len(deleted)
+            purged.setdefault(tenant, []).extend(deleted)
 
             results = sorted(results, key=lambda k: k["name"], reverse=False)
             data[tenant] = results
         return data
 
+    @staticmethod
+    def sync_devices_batch(context, devices):
+        """
+        Sync a batch of Cisco DNA Center Devices
+        """
+        for device in devices:
+
+            # Sync Manufacture
+            device.manufacture = Netbox.Sync.manufacturer(
+                context=context, manufacture=device.type.split()[0]
+            )
+
+            # Sync Device Types
+            slug = System.Slug.create(device.family)
+            device.family_type = Netbox.Sync.devicetype(
+                context=context,
+                manufacture=device.manufacture,
+                model=device.family,
+                slug=slug,
+            )
+            # Add tag to devicetype
+            Netbox.Sync.tags(task="update", context=context, obj=device.family_type)
+
+            # Sync Device Roles
+            slug = System.Slug.create(device.role)
+            device.device_role = Netbox.Sync.devicerole(
+                context=context, role=device.role, slug=slug
+            )
+
+            # Sync Device IP Address
+            device.primary_ip4 = Netbox.Sync.ipaddress(
+                context=context,
+                address=device.managementIpAddress,
+                hostname=device.hostname,
+            )
+            # Add tags to IP Address
+            Netbox.Sync.tags(task="update", context=context, obj=device.primary_ip4)
+
+        # Sync Devices in bulk and get status per Device
+        sync_status = Netbox.Sync.devices(context=context, devices=devices)
+        results = []
+        for device in devices:
+            # Add tag to device
+            if sync_status[device.serialNumber][0].pk is not None:
+                Netbox.Sync.tags(
+                    task="update",
+                    context=context,
+                    obj=sync_status[device.serialNumber][0],
+                )
+            results.append(sync_status[device.serialNumber][1])
+        return results
+
+    @staticmethod
+    def savepoints(context, items, func, progress=None):
+        """
+        Run `func` on batches of items, each batch within an atomic block
+        (committed on its own, or a savepoint within an outer transaction)
+
+        A failed batch is rolled back and retried one item at the time,
+        so that only the bad items are reported as errors. `progress` is
+        called with the number of items done after each batch.
+        """
+        results = []
+        size = System.Config.get("commit_batch_size")
+        for i in range(0, len(items), size):
+            batch = items[i : i + size]
+            try:
+                with transaction.atomic():
+                    results += zip(batch, func(context, batch), [None] * len(batch))
+            except Exception as error_msg:
+                print("Error in batch, retry one by one: {}".format(error_msg))
+                context.reset()
+                for item in batch:
+                    try:
+                        with transaction.atomic():
+                            results.append((item, func(context, [item])[0], None))
+                    except Exception as error_msg:
+                        context.reset()
+                        results.append((item, None, error_msg))
+            if progress is not None:
+                progress(len(results))
+        return results
+
+    @staticmethod
+    def incremental(**kwargs):
+        """
+        Skip unchanged objects, unless a full reconcile is requested
+        """
+        if kwargs.get("reconcile") is True:
+            return False
+        return System.Config.get("incremental")
+
+    @staticmethod
+    def tag(dry_run=False):
+        """
+        Cisco DNA Center Tag in NetBox (not created on a dry run)
+        """
+        if dry_run:
+            return System.PluginTag.filter().first()
+        return Netbox.Sync.tags(task="system")
+
+    @staticmethod
+    def tenant(tenant, dry_run=False):
+        """
+        NetBox Tenant of a Cisco DNA Center Instance (not created on a dry run)
+        """
+        if dry_run:
+            return Tenant.objects.filter(name=tenant).first() or Tenant(name=tenant)
+        return Netbox.Sync.tenants(
+            task="system", tenant=tenant, slug=tenant.replace(".", "-")
+        )
+
+    @classmethod
+    def plan(cls, **kwargs):
+        """
+        Plan a Sync of Cisco DNA Center, nothing is written to NetBox
+
+        Devices are planned against the Sites that already are in NetBox.
+        """
+        kwargs["dry_run"] = True
+        data = {}
+        for stage in [cls.sync_sites, cls.sync_devices]:
+            for tenant, operations in stage(**kwargs).items():
+                data.setdefault(tenant, {"summary": {}, "operations": []})
+                for operation in operations:
+                    summary = data[tenant]["summary"].setdefault(
+                        operation["model"],
+                        {"create": 0, "update": 0, "delete": 0, "skip": 0},
+                    )
+                    summary[operation["action"]] += 1
+                    data[tenant]["operations"].append(operation)
+        return data
+
     def purge_tenant(**kwargs):
         """
         Remove NetBox Tenant that is related to Cisco DNA Center
@@ -384,6 +1513,10 @@ class Data:
         data["id"] = str(id)
         data["task"] = str(j.func_name)
         data["status"] = str(j.get_status())
-        data["result"] = str(j.result)
-        data["exception"] = str(j.exc_info)
+        # Only the id of the Sync Run, not the whole result
+        if isinstance(j.result, dict):
+            data["run"] = j.result.get("run")
+        data["exception"] = str(j.exc_info) if j.exc_info else None
+        # Progress of the running Sync, for the page polling the job
+        data["progress"] = Progress.snapshot(id)
         return data
@@ -0,0 +1,97 @@
+import hmac
+import ipaddress
+import re
+from urllib.parse import urlparse
+from ..models import Settings
+from .utilities import System
+
+
+class Events:
+    """
+    Cisco DNA Center Event Notifications (webhook)
+
+    Only the Device or Site of an event is used, the sync fetches its
+    current state from Cisco DNA Center (added, changed or removed).
+    """
+
+    # Keys of an event (or its `details`) that identify a Device or a Site
+    DEVICE = [
+        "deviceUuid",
+        "networkDeviceId",
+        "deviceId",
+        "serialNumber",
+        "managementIpAddress",
+        "Device",
+        "hostname",
+    ]
+    SITE = ["siteId", "siteUuid"]
+
+    UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+    @staticmethod
+    def enabled():
+        """
+        The webhook is disabled until an `events_secret` is set
+        """
+        return bool(System.Config.get("events_secret"))
+
+    @classmethod
+    def authorized(cls, request):
+        """
+        Check the `events_secret`, sent as Authorization header (Bearer optional)
+        """
+        if cls.enabled() is False:
+            return False
+        secret = System.Config.get("events_secret")
+        token = request.headers.get("Authorization", "")
+        if token.startswith("Bearer "):
+            token = token[len("Bearer ") :]
+        return hmac.compare_digest(token.encode(), str(secret).encode())
+
+    @staticmethod
+    def tenant(request, payload):
+        """
+        Cisco DNA Center of an event, from `?tenant=<hostname>` or the event link
+        """
+        tenants = Settings.objects.filter(status=True)
+        hostname = request.GET.get("tenant")
+        if hostname is None and payload.get("ciscoDnaEventLink"):
+            hostname = urlparse(payload["ciscoDnaEventLink"]).hostname
+        if hostname is not None:
+            return tenants.filter(hostname=hostname).first()
+        # Single Cisco DNA Center, no need to tell
+        if tenants.count() == 1:
+            return tenants.first()
+        return None
+
+    @classmethod
+    def targets(cls, payload):
+        """
+        Devices and Sites of an event, as a list of (kind, key)
+        """
+        targets = []
+        for data in [payload, payload.get("details") or {}]:
+            for kind, keys in [("device", cls.DEVICE), ("site", cls.SITE)]:
+                for key in keys:
+                    value = data.get(key)
+                    if isinstance(value, str) and value.strip():
+                        targets.append((kind, value.strip()))
+                        break
+        # Keep the first key per kind
+        results = {}
+        for kind, key in targets:
+            results.setdefault(kind, key)
+        return list(results.items())
+
+    @classmethod
+    def lookup(cls, key):
+        """
+        Cisco DNA Center device list filter for a Device key
+        """
+        if cls.UUID.match(key.lower()):
+            return "id"
+        try:
+            ipaddress.ip_address(key)
+            return "management_ip_address"
+        except ValueError:
+            return None
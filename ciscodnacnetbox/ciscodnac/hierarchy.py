@@ -0,0 +1,80 @@
+from collections import Counter
+
+
+class Hierarchy:
+    """
+    Tree of Cisco DNA Center Sites, built once from the `get_site()` response
+
+    Areas are synced as Regions, buildings as Sites (in the Region of their
+    area) and floors as Locations of their building. Each Site is resolved
+    once in memory, parents first, so that NetBox is written level by level
+    in bulk instead of looking up the parents of every Site.
+    """
+
+    def __init__(self, sites):
+        self.nodes = {site.id: site for site in sites}
+        self.regions = []
+        self.sites = []
+        self.locations = []
+        # Not synced, e.g. floors without a building (`Global` is the root)
+        self.skipped = []
+        self.resolved = set()
+        for site in sites:
+            self.resolve(site)
+
+        # Region names are unique in NetBox, the hierarchy tells duplicates apart
+        names = Counter(site.name for site in self.regions)
+        for site in self.regions:
+            site.unique = names[site.name] == 1
+
+    @staticmethod
+    def kind(site):
+        """
+        Type of a Cisco DNA Center Site (area, building or floor)
+        """
+        for additionalInfo in site.additionalInfo:
+            if "Location" in additionalInfo["nameSpace"]:
+                return additionalInfo["attributes"].get("type")
+        return None
+
+    def resolve(self, site):
+        """
+        Depth, Region (area) and building of a Site, from its parent
+        """
+        if site.id in self.resolved:
+            return
+        self.resolved.add(site.id)
+        site.type = self.kind(site)
+        site.depth = 0
+        site.region = None
+        site.building = None
+
+        parent = self.nodes.get(site.get("parentId"))
+        if parent is not None and parent.id != site.id:
+            self.resolve(parent)
+            site.depth = parent.depth + 1
+            site.region = parent.id if parent.type == "area" else parent.region
+            site.building = parent.id if parent.type == "building" else parent.building
+        elif site.type is None:
+            # Global
+            return
+
+        if site.type == "area":
+            self.regions.append(site)
+        elif site.type == "building":
+            self.sites.append(site)
+        elif site.type == "floor" and site.building is not None:
+            self.locations.append(site)
+        else:
+            self.skipped.append(site)
+
+    def path(self, site):
+        """
+        Site and its parents, parents first
+        """
+        path = [site]
+        parent = self.nodes.get(site.get("parentId"))
+        while parent is not None and parent not in path:
+            path.insert(0, parent)
+            parent = self.nodes.get(parent.get("parentId"))
+        return path
@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from .utilities import System
+
+
+class RateLimiter:
+    """
+    Adaptive token bucket per Cisco DNA Center, shared within the process
+
+    Starts at `rate_limit` requests per minute. A 429 halves the rate and
+    pauses the bucket for `Retry-After`, every successful call raises the
+    rate again by 1/20 of the limit until it's back at `rate_limit`.
+
+    Without `rate_limit` (the default) requests aren't paced until the
+    first 429, they are only counted. The limit is then the requests sent
+    within the last minute, and the rate recovers up to that limit.
+    """
+
+    # Seconds over which the sent rate is measured while not paced, Cisco
+    # DNA Center limits the requests per minute
+    window = 60.0
+
+    __limiters = {}
+    __lock = threading.Lock()
+
+    def __init__(self, rate=None):
+        self.paced = bool(rate)
+        self.sent = 0
+        self.measured = 0.0
+        self.started = time.monotonic()
+        self.limit((rate or 60) / 60)
+        self.lock = threading.Lock()
+
+    def limit(self, rate):
+        """
+        Pace at `rate` requests per second, the maximum until the next limit
+        """
+        self.max_rate = rate
+        self.min_rate = self.max_rate / 32
+        self.rate = self.max_rate
+        # Burst of at most one second of requests (at least one request)
+        self.capacity = max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.halved = 0.0
+
+    @classmethod
+    def get(cls, hostname):
+        with cls.__lock:
+            limiter = cls.__limiters.get(hostname)
+            if limiter is None:
+                limiter = cls(System.Config.get("rate_limit"))
+                cls.__limiters[hostname] = limiter
+            return limiter
+
+    def reserve(self):
+        """
+        Take a token, returns the seconds to wait before sending the request
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.paced is False:
+                # Rate of the last window, the limit after a 429
+                if now - self.started > self.window:
+                    self.measured = self.sent / (now - self.started)
+                    self.started = now
+                    self.sent = 0
+                self.sent += 1
+                return 0.0
+            # `updated` is in the future while paused by `Retry-After`
+            if now > self.updated:
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+            self.tokens -= 1
+            return max(0.0, self.updated - now) + max(0.0, -self.tokens) / self.rate
+
+    def throttled(self, retry_after=None):
+        """
+        Cisco DNA Center answered 429, slow down
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.paced is False:
+                elapsed = max(self.window, now - self.started)
+                self.limit(max(1 / 60, self.measured, self.sent / elapsed))
+                self.paced = True
+            # Requests sent before the rate was halved get a 429 too
+            if now - self.halved > 1 / self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.halved = now
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after is not None:
+                self.updated = max(self.updated, time.monotonic() + retry_after)
+
+    def success(self):
+        with self.lock:
+            if self.paced is False:
+                return
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class Backoff:
+    """
+    Retry policy for Cisco DNA Center API calls
+    """
+
+    # Throttled or temporarily unavailable
+    STATUS = [429, 502, 503, 504]
+
+    @staticmethod
+    def delay(attempt, retry_after=None):
+        """
+        Exponential backoff with full jitter, at least `Retry-After`
+        """
+        cap = min(
+            System.Config.get("backoff_max"),
+            System.Config.get("backoff") * 2**attempt,
+        )
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def retry_after(headers):
+        """
+        Seconds from a `Retry-After` header (seconds or HTTP date)
+        """
+        value = headers.get("Retry-After") if headers is not None else None
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
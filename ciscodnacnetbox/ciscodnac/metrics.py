@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager
+from django.db import connection
+from .client import Client
+
+
+class Metrics:
+    """
+    Duration, database queries and Cisco DNA Center API calls per stage
+
+    API calls are counted for the whole process, concurrent syncs within
+    the same process (e.g. two views) are added to each other.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure a block, repeated blocks with the same name are summed
+        """
+        queries = [0]
+
+        def counter(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        calls, api_seconds = Client.stats()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                yield
+        finally:
+            stats = self.stages.setdefault(
+                name, {"seconds": 0.0, "queries": 0, "api_calls": 0, "api_seconds": 0.0}
+            )
+            stats["seconds"] += time.perf_counter() - start
+            stats["queries"] += queries[0]
+            stats["api_calls"] += Client.stats()[0] - calls
+            stats["api_seconds"] += Client.stats()[1] - api_seconds
+
+    def iterate(self, name, iterable):
+        """
+        Measure the time spent getting each item, e.g. API pages
+        """
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            with self.stage(name):
+                item = next(iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def results(self):
+        """
+        Stages with rounded values, to be stored with the RQ job result
+        """
+        results = {}
+        for name, stats in self.stages.items():
+            results[name] = {
+                "seconds": round(stats["seconds"], 3),
+                "queries": stats["queries"],
+                "api_calls": stats["api_calls"],
+                "api_avg_ms": round(
+                    stats["api_seconds"] * 1000 / max(stats["api_calls"], 1), 1
+                ),
+            }
+        return results
@@ -0,0 +1,132 @@
+import os
+from django_rq import get_queue
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+
+class Queue:
+    """
+    RQ queue depth of the Sync jobs, read when scraped
+    """
+
+    def collect(self):
+        queue = get_queue("default")
+        jobs = GaugeMetricFamily(
+            "ciscodnacnetbox_rq_jobs",
+            "RQ jobs in the queue used by the Sync",
+            labels=["queue", "state"],
+        )
+        jobs.add_metric([queue.name, "queued"], len(queue))
+        jobs.add_metric([queue.name, "started"], queue.started_job_registry.count)
+        jobs.add_metric([queue.name, "deferred"], queue.deferred_job_registry.count)
+        jobs.add_metric([queue.name, "failed"], queue.failed_job_registry.count)
+        yield jobs
+
+
+class Prometheus:
+    """
+    Prometheus metrics of the Plugin
+
+    Syncs run in the RQ workers, so set `PROMETHEUS_MULTIPROC_DIR` for both
+    NetBox and rqworker to see them from the NetBox process.
+    """
+
+    registry = CollectorRegistry()
+    registry.register(Queue())
+
+    sync_duration = Histogram(
+        "ciscodnacnetbox_sync_duration_seconds",
+        "Duration of a Sync stage per Cisco DNA Center",
+        ["tenant", "stage"],
+        buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+        registry=registry,
+    )
+    sync_step_duration = Histogram(
+        "ciscodnacnetbox_sync_step_duration_seconds",
+        "Duration of a step (auth, fetch, plan, writes...) within a Sync stage",
+        ["tenant", "stage", "step"],
+        buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600),
+        registry=registry,
+    )
+    sync_objects = Counter(
+        "ciscodnacnetbox_sync_objects",
+        "NetBox objects handled by a Sync, per outcome",
+        ["tenant", "stage", "action"],
+        registry=registry,
+    )
+    sync_failures = Counter(
+        "ciscodnacnetbox_sync_failures",
+        "Sync stages that failed",
+        ["tenant", "stage"],
+        registry=registry,
+    )
+    api_duration = Histogram(
+        "ciscodnacnetbox_api_request_duration_seconds",
+        "Latency of Cisco DNA Center API calls",
+        ["tenant", "endpoint"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+        registry=registry,
+    )
+    api_errors = Counter(
+        "ciscodnacnetbox_api_errors",
+        "Failed Cisco DNA Center API calls",
+        ["tenant", "endpoint", "status"],
+        registry=registry,
+    )
+    auth_failures = Counter(
+        "ciscodnacnetbox_auth_failures",
+        "Failed authentications against Cisco DNA Center",
+        ["tenant"],
+        registry=registry,
+    )
+
+    @classmethod
+    def request(cls, tenant, endpoint, seconds, error=None):
+        """
+        Record a Cisco DNA Center API call
+        """
+        cls.api_duration.labels(tenant=tenant, endpoint=endpoint).observe(seconds)
+        if error is not None:
+            cls.api_errors.labels(tenant=tenant, endpoint=endpoint, status=error).inc()
+
+    @classmethod
+    def sync(cls, tenant, stage, seconds, results, deleted, metrics):
+        """
+        Record a Sync stage of a Cisco DNA Center
+        """
+        cls.sync_duration.labels(tenant=tenant, stage=stage).observe(seconds)
+        for step, stats in metrics.results().items():
+            cls.sync_step_duration.labels(
+                tenant=tenant, stage=stage, step=step
+            ).observe(stats["seconds"])
+
+        # Count per outcome (e.g. `Error: Site not found` as `error`)
+        actions = {"deleted": deleted}
+        for result in results:
+            action = str(result.get("sync_status", "")).split(":")[0].lower()
+            actions[action] = actions.get(action, 0) + 1
+        for action, count in actions.items():
+            cls.sync_objects.labels(tenant=tenant, stage=stage, action=action).inc(
+                count
+            )
+
+    @classmethod
+    def export(cls):
+        """
+        Metrics in the Prometheus text format, of all processes if enabled
+        """
+        registry = cls.registry
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get(
+            "prometheus_multiproc_dir"
+        ):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(Queue())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
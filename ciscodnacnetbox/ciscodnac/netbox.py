@@ -1,21 +1,438 @@
 from decimal import Decimal
+from functools import cached_property
 import ipaddress
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Max
 from django.shortcuts import get_object_or_404
-from extras.models import Tag
-from dcim.models import Site, Device, DeviceRole, DeviceType, Manufacturer
+from django.utils import timezone
+from extras.models import Tag, TaggedItem
+from dcim.models import (
+    Device,
+    DeviceRole,
+    DeviceType,
+    Location,
+    Manufacturer,
+    Region,
+    Site,
+)
 from ipam.models import IPAddress
 from dcim.choices import DeviceStatusChoices
 from tenancy.models import Tenant
 from utilities.choices import ColorChoices
+from ..models import Fingerprint, Settings
 from .utilities import System
 
 
 class Netbox:
+    class Context:
+        """
+        NetBox objects resolved once per Tenant and sync run
+        """
+
+        def __init__(self, tenant, tag):
+            self.tenant = tenant
+            self.name = tenant.name
+            self.tag = tag
+            # Site names looked up outside of the Tenant (`prefetch_sites`)
+            self.prefetched = set()
+            # Areas and floors as Regions and Locations (`site_hierarchy`)
+            self.hierarchy = System.Config.get("site_hierarchy")
+            # NetBox Objects waiting for the Tag (keyed by model)
+            self.tagged = {}
+
+        def reset(self):
+            """
+            Drop resolved NetBox objects, e.g. after a rollback
+            """
+            for name in [
+                "sites",
+                "site_names",
+                "regions",
+                "region_names",
+                "locations",
+                "devices",
+                "primary_ips",
+                "ipaddresses",
+                "manufacturers",
+                "devicetypes",
+                "deviceroles",
+            ]:
+                self.__dict__.pop(name, None)
+
+        def scoped(self, queryset):
+            # Objects of the Tenant, none if the Tenant isn't in NetBox yet (dry run)
+            if self.tenant.pk is None:
+                return queryset.none()
+            return queryset.filter(tenant=self.tenant)
+
+        def managed(self, model):
+            # Objects managed for the Tenant, Regions have no Tenant (description)
+            if model is Region:
+                return model.objects.filter(
+                    description="Managed by {}".format(self.name)
+                )
+            return self.scoped(model.objects.all())
+
+        @cached_property
+        def sites(self):
+            # Sites of the Tenant (keyed by slug/uuid)
+            return {s.slug: s for s in self.scoped(Site.objects.all())}
+
+        @cached_property
+        def site_names(self):
+            # Sites of the Tenant and prefetched Sites (keyed by name)
+            names = {s.name: s for s in self.sites.values()}
+            missing = [name for name in self.prefetched if name not in names]
+            if len(missing) != 0:
+                for site in Site.objects.filter(name__in=missing):
+                    names[site.name] = site
+            return names
+
+        def prefetch_sites(self, names):
+            # Sites outside of the Tenant with these names, in one query
+            missing = [name for name in names if name not in self.site_names]
+            self.prefetched.update(missing)
+            for site in Site.objects.filter(name__in=missing):
+                self.site_names[site.name] = site
+
+        @cached_property
+        def regions(self):
+            # Regions (keyed by slug/uuid), Regions have no Tenant
+            return {r.slug: r for r in Region.objects.all()}
+
+        @cached_property
+        def region_names(self):
+            # Regions (keyed by name, unique in NetBox)
+            return {r.name: r for r in self.regions.values()}
+
+        @cached_property
+        def locations(self):
+            # Locations of the Tenant (keyed by slug/uuid), with their Site
+            queryset = self.scoped(Location.objects.select_related("site"))
+            return {location.slug: location for location in queryset}
+
+        @cached_property
+        def devices(self):
+            # Devices of the Tenant (keyed by serial)
+            return {d.serial: d for d in self.scoped(Device.objects.all())}
+
+        @cached_property
+        def primary_ips(self):
+            # Primary IP owners within the Tenant (IPAddress id -> serial)
+            return {
+                d.primary_ip4_id: d.serial
+                for d in self.devices.values()
+                if d.primary_ip4_id is not None
+            }
+
+        @cached_property
+        def ipaddresses(self):
+            # IP Addresses of the Tenant (keyed by address)
+            return {str(ip.address): ip for ip in self.scoped(IPAddress.objects.all())}
+
+        @cached_property
+        def manufacturers(self):
+            return {m.name: m for m in Manufacturer.objects.all()}
+
+        @cached_property
+        def devicetypes(self):
+            return {(t.manufacturer_id, t.model): t for t in DeviceType.objects.all()}
+
+        @cached_property
+        def deviceroles(self):
+            return {r.name: r for r in DeviceRole.objects.all()}
+
+        @cached_property
+        def settings(self):
+            return Settings.objects.get(hostname=self.name)
+
+        @cached_property
+        def fingerprints(self):
+            # Fingerprints of the last sync (keyed by type and key)
+            return {
+                (f.type, f.key): f
+                for f in Fingerprint.objects.filter(settings=self.settings)
+            }
+
+        def unchanged(self, type, key, digest):
+            # Skip if the Fingerprint is the same as the last sync
+            fingerprint = self.fingerprints.get((type, key))
+            return fingerprint is not None and fingerprint.digest == digest
+
+    class Plan:
+        """
+        Diff Cisco DNA Center against NetBox, without writing to NetBox
+        """
+
+        @staticmethod
+        def operation(model, key, __obj, fields):
+            """
+            Create/Update operation, None if the NetBox Object is in sync
+
+            `fields` maps an attribute to its wanted value, or to a tuple of
+            the wanted value and how it's displayed (e.g. related objects).
+            """
+            changes = {}
+            for field, value in fields.items():
+                value, display = value if isinstance(value, tuple) else (value, value)
+                if __obj is None or getattr(__obj, field) != value:
+                    changes[field[:-3] if field.endswith("_id") else field] = str(
+                        display
+                    )
+            if __obj is None:
+                action = "create"
+            elif len(changes) != 0:
+                action = "update"
+            else:
+                return None
+            return {"model": model, "action": action, "key": key, "changes": changes}
+
+        @classmethod
+        def site(cls, context, site):
+            """
+            Plan Site operations with NetBox
+            """
+            # Sites outside of the Tenant are prefetched by name
+            name = site.siteNameHierarchy[0:100]
+            __obj = context.site_names.get(name)
+            fields = {
+                "name": name,
+                "slug": site.slug[0:100],
+                "comments": site.id,
+                "description": "Managed by {}".format(context.name),
+                "tenant_id": (context.tenant.pk, context.name),
+            }
+            fields.update(cls.address(site))
+            return cls.operation("site", site.slug[0:100], __obj, fields)
+
+        @staticmethod
+        def address(site):
+            """
+            Address and coordinates of a Cisco DNA Center Site, if available
+            """
+            fields = {}
+            for additionalInfo in site.additionalInfo:
+                if "Location" in additionalInfo["nameSpace"]:
+                    attributes = additionalInfo["attributes"]
+                    if attributes.get("address") is not None:
+                        fields["physical_address"] = attributes["address"]
+                    for field in ["latitude", "longitude"]:
+                        if attributes.get(field) is not None:
+                            fields[field] = Decimal(attributes[field])
+            return fields
+
+        @classmethod
+        def node(cls, context, site):
+            """
+            NetBox model, object and wanted fields of a Cisco DNA Center area
+            (Region), building (Site) or floor (Location) of a `Hierarchy`
+            """
+            description = "Managed by {}".format(context.name)
+            if site.type == "area":
+                __obj = context.regions.get(site.slug)
+                # Full hierarchy if the name is taken by another Region
+                name = site.name[0:100]
+                owner = context.region_names.get(name)
+                if site.unique is False or owner not in [None, __obj]:
+                    name = site.siteNameHierarchy[0:100]
+                parent = context.regions.get(site.region)
+                fields = {
+                    "name": name,
+                    "slug": site.slug,
+                    "parent_id": (
+                        getattr(parent, "pk", None),
+                        getattr(parent, "name", None),
+                    ),
+                    "description": description,
+                }
+                return "region", __obj, fields
+            if site.type == "building":
+                name = site.siteNameHierarchy[0:100]
+                __obj = context.sites.get(site.slug) or context.site_names.get(name)
+                region = context.regions.get(site.region)
+                fields = {
+                    "name": name,
+                    "slug": site.slug,
+                    "comments": site.id,
+                    "description": description,
+                    "tenant_id": (context.tenant.pk, context.name),
+                    "region_id": (
+                        getattr(region, "pk", None),
+                        getattr(region, "name", None),
+                    ),
+                }
+                fields.update(cls.address(site))
+                return "site", __obj, fields
+            building = context.sites.get(site.building)
+            fields = {
+                "name": site.name[0:100],
+                "slug": site.slug,
+                "site_id": (
+                    getattr(building, "pk", None),
+                    getattr(building, "name", None),
+                ),
+                "description": description,
+                "tenant_id": (context.tenant.pk, context.name),
+            }
+            return "location", context.locations.get(site.slug), fields
+
+        @classmethod
+        def hierarchy(cls, context, tree):
+            """
+            Plan Region, Site and Location operations with NetBox, parents first
+            """
+            context.prefetch_sites([s.siteNameHierarchy[0:100] for s in tree.sites])
+            operations = []
+            for site in tree.regions + tree.sites + tree.locations:
+                model, __obj, fields = cls.node(context, site)
+                operation = cls.operation(model, site.slug, __obj, fields)
+                if operation is not None:
+                    operations.append(operation)
+            return operations
+
+        @classmethod
+        def device(cls, context, device):
+            """
+            Plan Device operations with NetBox, including its related objects
+
+            `device.status` and `device.site` must be set, operations that
+            are already in sync are left out.
+            """
+            description = "Managed by {}".format(context.name)
+            manufacture = device.type.split()[0]
+            family = System.Slug.create(device.family)
+            role = System.Slug.create(device.role)
+            address = str(ipaddress.ip_interface(device.managementIpAddress))
+
+            # Related objects resolved through the Context
+            __manufacturer = context.manufacturers.get(manufacture)
+            __devicetype = None
+            if __manufacturer is not None:
+                __devicetype = context.devicetypes.get(
+                    (__manufacturer.pk, device.family)
+                )
+            __devicerole = context.deviceroles.get(device.role)
+            __ipaddress = context.ipaddresses.get(address)
+
+            fields = {
+                "name": device.hostname[0:100],
+                "status": device.status,
+                "site_id": (device.site.pk, device.site.name),
+                "device_role_id": (
+                    getattr(__devicerole, "pk", None),
+                    device.role,
+                ),
+                "device_type_id": (
+                    getattr(__devicetype, "pk", None),
+                    device.family,
+                ),
+                "primary_ip4_id": (getattr(__ipaddress, "pk", None), address),
+                "comments": description,
+            }
+            if context.hierarchy:
+                fields["location_id"] = (
+                    getattr(device.location, "pk", None),
+                    getattr(device.location, "name", None),
+                )
+
+            operations = [
+                cls.operation(
+                    "manufacturer",
+                    manufacture,
+                    __manufacturer,
+                    {
+                        "name": manufacture,
+                        "slug": manufacture.lower(),
+                        "description": description,
+                    },
+                ),
+                cls.operation(
+                    "devicetype",
+                    device.family,
+                    __devicetype,
+                    {
+                        "model": device.family,
+                        "slug": family.lower(),
+                        "comments": description,
+                    },
+                ),
+                cls.operation(
+                    "devicerole",
+                    device.role,
+                    __devicerole,
+                    {
+                        "name": device.role,
+                        "slug": role.lower(),
+                        "color": ColorChoices.COLOR_BLUE,
+                        "vm_role": False,
+                        "description": description,
+                    },
+                ),
+                cls.operation(
+                    "ipaddress",
+                    address,
+                    __ipaddress,
+                    {
+                        "status": DeviceStatusChoices.STATUS_ACTIVE,
+                        "dns_name": device.hostname,
+                        "description": description,
+                    },
+                ),
+                cls.operation(
+                    "device",
+                    device.serialNumber[0:50],
+                    context.devices.get(device.serialNumber[0:50]),
+                    fields,
+                ),
+            ]
+            return [operation for operation in operations if operation is not None]
+
+        @staticmethod
+        def purge(context, type, keys):
+            """
+            Plan deletes of NetBox Objects that are removed in Cisco DNA Center
+            """
+            if type == "devices":
+                model, field = Device, "serial"
+            elif type == "sites":
+                model, field = Site, "slug"
+            elif type == "regions":
+                model, field = Region, "slug"
+            elif type == "locations":
+                model, field = Location, "slug"
+            else:
+                raise Exception("Not implemented yet")
+            stale = (
+                context.managed(model)
+                .exclude(**{"{}__in".format(field): list(keys)})
+                .values_list(field, "name")
+            )
+            return [
+                {
+                    "model": model._meta.model_name,
+                    "action": "delete",
+                    "key": key,
+                    "changes": {"name": name},
+                }
+                for key, name in stale
+            ]
+
     class Sync:
         """
         Sync data to NetBox Models
         """
 
+        @staticmethod
+        def naturalize(model, objs):
+            """
+            Natural ordering key (`_name`) of renamed objects, bulk_update()
+            doesn't compute it like save() does
+            """
+            field = model._meta.get_field("_name")
+            for __obj in objs:
+                field.pre_save(__obj, False)
+
         @staticmethod
         def tenants(**kwargs):
             """
@@ -59,33 +476,38 @@ class Netbox:
                     )
                 return System.PluginTag.get()
             elif "update" in kwargs["task"]:
-                # Get Object before saving Tag
-                if kwargs["model"].lower() == "Tenant".lower():
-                    __obj = Tenant.objects.get(name=kwargs["filter"])
-                if kwargs["model"].lower() == "DeviceType".lower():
-                    __obj = DeviceType.objects.get(slug=kwargs["filter"])
-                if kwargs["model"].lower() == "DeviceRole".lower():
-                    __obj = DeviceRole.objects.get(name=kwargs["filter"])
-                if kwargs["model"].lower() == "Device".lower():
-                    __obj = Device.objects.get(serial=kwargs["filter"])
-                if kwargs["model"].lower() == "IPAddress".lower():
-                    kwargs["filter"] = str(ipaddress.IPv4Network(kwargs["filter"])[0])
-                    __obj = IPAddress.objects.get(
-                        address=kwargs["filter"],
-                        tenant=Tenant.objects.get(name=kwargs["tenant"]).id,
-                    )
-                if kwargs["model"].lower() == "Site".lower():
-                    __obj = Site.objects.get(name=kwargs["filter"])
-
-                if kwargs["tag"] not in __obj.tags.all():
-                    # Add Cisco DNA Center Tag to NetBox Object
-                    __obj.tags.add(kwargs["tag"])
-                    __obj.save()
+                # Queue NetBox Object, the Tag is added by task `bulk`
+                __obj = kwargs["obj"]
+                kwargs["context"].tagged.setdefault(type(__obj), set()).add(__obj.pk)
+            elif "bulk" in kwargs["task"]:
+                # Add Cisco DNA Center Tag to all queued NetBox Objects at once
+                context = kwargs["context"]
+                batch_size = System.Config.get("bulk_batch_size")
+                for model, pks in context.tagged.items():
+                    pks = list(pks)
+                    content_type = ContentType.objects.get_for_model(model)
+                    for i in range(0, len(pks), batch_size):
+                        missing = (
+                            model.objects.filter(pk__in=pks[i : i + batch_size])
+                            .exclude(tags=context.tag)
+                            .values_list("pk", flat=True)
+                        )
+                        TaggedItem.objects.bulk_create(
+                            [
+                                TaggedItem(
+                                    tag=context.tag,
+                                    content_type=content_type,
+                                    object_id=pk,
+                                )
+                                for pk in missing
+                            ]
+                        )
+                context.tagged = {}
             else:
                 raise Exception("Not implemented yet")
 
         @staticmethod
-        def site(tenant, site):
+        def site(context, site):
             """
             Handle Site operations with NetBox
             """
@@ -95,27 +517,32 @@ class Netbox:
             site.slug = site.slug[0:100]
 
             # Gather site in Netbox (site name isn't unique, even with multiple tenants)
-            if Site.objects.filter(name=site.siteNameHierarchy).exists() is False:
-                Site.objects.create(
+            # Sites outside of the Tenant are prefetched by name (`prefetch_sites`)
+            __obj = context.site_names.get(site.siteNameHierarchy)
+            if __obj is None:
+                __obj = Site.objects.create(
                     name=site.siteNameHierarchy,
                     slug=site.slug,
                     comments=site.id,
-                    description="Managed by {}".format(tenant),
-                    tenant=Tenant.objects.get(name=tenant),
+                    description="Managed by {}".format(context.name),
+                    tenant=context.tenant,
                 )
                 sync = "Created"
+                __save = False
             else:
-                Site.objects.filter(name=site.siteNameHierarchy).update(
-                    slug=site.slug,
-                    comments=site.id,
-                    description="Managed by {}".format(tenant),
-                    tenant=Tenant.objects.get(name=tenant).id,
+                __save = (
+                    __obj.slug != site.slug
+                    or __obj.comments != site.id
+                    or __obj.description != "Managed by {}".format(context.name)
+                    or __obj.tenant_id != context.tenant.pk
                 )
+                __obj.slug = site.slug
+                __obj.comments = site.id
+                __obj.description = "Managed by {}".format(context.name)
+                __obj.tenant = context.tenant
                 sync = "Updated"
-            __obj = Site.objects.get(name=site.siteNameHierarchy)
 
             # Check if additional information is avaible for the site
-            __save = False
             if len(site.additionalInfo) != 0:
                 for additionalInfo in site.additionalInfo:
                     if "Location" in additionalInfo["nameSpace"]:
@@ -148,211 +575,428 @@ class Netbox:
                 # Only update Change log if something is updated
                 __obj.save()
 
-            return Site.objects.get(name=site.siteNameHierarchy), sync
+            context.sites[__obj.slug] = __obj
+            context.site_names[__obj.name] = __obj
+            return __obj, sync
+
+        @staticmethod
+        def hierarchy(context, tree):
+            """
+            Handle Region, Site and Location operations with NetBox in bulk
+
+            Levels are written parents first, and each level depth by depth,
+            so that children get the primary key of their parent. New roots
+            get a tree of their own, and only the trees of the Regions and
+            Locations created or moved are rebuilt at the end.
+            """
+            results = {}
+            batch_size = System.Config.get("bulk_batch_size")
+            caches = {
+                Region: context.regions,
+                Site: context.sites,
+                Location: context.locations,
+            }
+            # Tree ids to rebuild, other trees (not managed) are left alone
+            trees = {Region: set(), Location: set()}
+            context.prefetch_sites([s.siteNameHierarchy[0:100] for s in tree.sites])
+            for model, level in [
+                (Region, tree.regions),
+                (Site, tree.sites),
+                (Location, tree.locations),
+            ]:
+                for depth in sorted({site.depth for site in level}):
+                    create = []
+                    update = []
+                    moved = []
+                    fields = set()
+                    if model is not Site:
+                        # Last tree id, the next new root takes the one after
+                        tree_id = model.objects.aggregate(Max("tree_id"))
+                        tree_id = tree_id["tree_id__max"] or 0
+                    for site in [s for s in level if s.depth == depth]:
+                        name, __obj, values = Netbox.Plan.node(context, site)
+                        operation = Netbox.Plan.operation(
+                            name, site.slug, __obj, values
+                        )
+                        if operation is None:
+                            results[site.slug] = [__obj, "Unchanged"]
+                            continue
+                        if __obj is None:
+                            __obj = model()
+                            create.append(__obj)
+                            results[site.slug] = [__obj, "Created"]
+                        else:
+                            if "parent" in operation["changes"]:
+                                # The tree the Region leaves
+                                trees[model].add(__obj.tree_id)
+                                fields.add("tree_id")
+                            fields.update(operation["changes"])
+                            update.append(__obj)
+                            results[site.slug] = [__obj, "Updated"]
+                        for field, value in values.items():
+                            if isinstance(value, tuple):
+                                value = value[0]
+                            setattr(__obj, field, value)
+
+                        # Tree of the parent, tree fields are rebuilt at the end
+                        if model is not Site and (
+                            __obj.pk is None or "parent" in operation["changes"]
+                        ):
+                            parent = None
+                            if model is Region:
+                                parent = context.regions.get(site.region)
+                            if parent is None:
+                                tree_id += 1
+                                __obj.tree_id = tree_id
+                            else:
+                                __obj.tree_id = parent.tree_id
+                            if __obj.pk is None:
+                                for field in ["lft", "rght", "level"]:
+                                    setattr(__obj, field, 0)
+                            moved.append(__obj)
+
+                    # Sites are ordered by their natural name, not set by bulk_update()
+                    if model is Site and "name" in fields:
+                        Netbox.Sync.naturalize(Site, update)
+                        fields.add("_name")
+
+                    # Write the depth in chunks, retry one by one on errors.
+                    # Updates first, so that a retried create (tree id from
+                    # the database) doesn't take the tree of a moved Region
+                    for task, chunk in [("update", update), ("create", create)]:
+                        if len(chunk) == 0:
+                            continue
+                        try:
+                            with transaction.atomic():
+                                if task == "create":
+                                    model.objects.bulk_create(
+                                        chunk, batch_size=batch_size
+                                    )
+                                else:
+                                    model.objects.bulk_update(
+                                        chunk, list(fields), batch_size=batch_size
+                                    )
+                        except Exception as error_msg:
+                            print(error_msg)
+                            for __obj in chunk:
+                                try:
+                                    with transaction.atomic():
+                                        __obj.save()
+                                except Exception as error_msg:
+                                    print(
+                                        "Error for {}: {}".format(__obj.slug, error_msg)
+                                    )
+                                    if task == "create":
+                                        __obj.pk = None
+                                    results[__obj.slug][1] = "Error: {}".format(
+                                        error_msg
+                                    )
+
+                    # Trees of the created and moved Regions and Locations
+                    for __obj in moved:
+                        if __obj.pk is not None:
+                            trees[model].add(__obj.tree_id)
+
+                    # Keep the Context in line with NetBox, for the next depth
+                    for __obj in create + update:
+                        if __obj.pk is not None:
+                            caches[model][__obj.slug] = __obj
+                            if model is Region:
+                                context.region_names[__obj.name] = __obj
+                            elif model is Site:
+                                context.site_names[__obj.name] = __obj
+
+            for model, tree_ids in trees.items():
+                for tree_id in sorted(tree_ids):
+                    model.objects.partial_rebuild(tree_id)
+            return {slug: tuple(result) for slug, result in results.items()}
 
         @staticmethod
-        def manufacturer(manufacture, tenant):
+        def manufacturer(context, manufacture):
             """
             Handle Manufacturer operations with NetBox
             """
 
             # Gather manufacture in Netbox
-            if Manufacturer.objects.filter(name=manufacture).exists() is False:
-                Manufacturer.objects.create(
+            __obj = context.manufacturers.get(manufacture)
+            description = "Managed by {}".format(context.name)
+            if __obj is None:
+                __obj = Manufacturer.objects.create(
                     name=manufacture,
                     slug=manufacture.lower(),
-                    description="Managed by {}".format(tenant),
+                    description=description,
                 )
-            else:
-                Manufacturer.objects.filter(name=manufacture).update(
+                context.manufacturers[manufacture] = __obj
+            elif __obj.slug != manufacture.lower() or __obj.description != description:
+                Manufacturer.objects.filter(pk=__obj.pk).update(
                     slug=manufacture.lower(),
-                    description="Managed by {}".format(tenant),
+                    description=description,
                 )
-            return Manufacturer.objects.get(name=manufacture)
+                __obj.slug = manufacture.lower()
+                __obj.description = description
+            return __obj
 
         @staticmethod
-        def devicetype(manufacture, model, slug, tenant):
+        def devicetype(context, manufacture, model, slug):
             """
             Handle DeviceType operations with NetBox
             """
 
             # Gather DeviceType in Netbox
-            if (
-                DeviceType.objects.filter(
-                    manufacturer=manufacture, model=model
-                ).exists()
-                is False
-            ):
-                DeviceType.objects.create(
+            __obj = context.devicetypes.get((manufacture.pk, model))
+            comments = "Managed by {}".format(context.name)
+            if __obj is None:
+                __obj = DeviceType.objects.create(
                     manufacturer=manufacture,
                     model=model,
                     slug=slug.lower(),
                     u_height=1,
-                    comments="Managed by {}".format(tenant),
+                    comments=comments,
                 )
-            else:
-                DeviceType.objects.filter(manufacturer=manufacture, model=model).update(
+                context.devicetypes[(manufacture.pk, model)] = __obj
+            elif __obj.slug != slug.lower() or __obj.comments != comments:
+                DeviceType.objects.filter(pk=__obj.pk).update(
                     slug=slug.lower(),
-                    comments="Managed by {}".format(tenant),
+                    comments=comments,
                 )
-            return DeviceType.objects.get(slug=slug.lower())
+                __obj.slug = slug.lower()
+                __obj.comments = comments
+            return __obj
 
         @staticmethod
-        def devicerole(role, slug, tenant):
+        def devicerole(context, role, slug):
             """
             Handle DeviceRole operations with NetBox
             """
 
             # Gather DeviceRole in Netbox
-            if DeviceRole.objects.filter(name=role).exists() is False:
-                DeviceRole.objects.create(
+            __obj = context.deviceroles.get(role)
+            description = "Managed by {}".format(context.name)
+            if __obj is None:
+                __obj = DeviceRole.objects.create(
                     name=role,
                     slug=slug.lower(),
                     color=ColorChoices.COLOR_BLUE,
                     vm_role=False,
-                    description="Managed by {}".format(tenant),
+                    description=description,
                 )
-            else:
-                DeviceRole.objects.filter(name=role).update(
+                context.deviceroles[role] = __obj
+            elif (
+                __obj.slug != slug.lower()
+                or __obj.color != ColorChoices.COLOR_BLUE
+                or __obj.vm_role is not False
+                or __obj.description != description
+            ):
+                DeviceRole.objects.filter(pk=__obj.pk).update(
                     slug=slug.lower(),
                     color=ColorChoices.COLOR_BLUE,
                     vm_role=False,
-                    description="Managed by {}".format(tenant),
+                    description=description,
                 )
-            return DeviceRole.objects.get(name=role)
+                __obj.slug = slug.lower()
+                __obj.color = ColorChoices.COLOR_BLUE
+                __obj.vm_role = False
+                __obj.description = description
+            return __obj
 
         @staticmethod
-        def device(tenant, device):
+        def devices(context, devices):
             """
-            Handle Device operations with NetBox
+            Handle Device operations with NetBox in bulk
             """
+            results = {}
+            batch_size = System.Config.get("bulk_batch_size")
 
-            # Match size in NetBox Database
-            device.hostname = device.hostname[0:100]
-            device.serialNumber = device.serialNumber[0:50]
+            # Devices and Primary IP owners of the Tenant in NetBox
+            existing = context.devices
+            owners = context.primary_ips
 
-            # Check device reachability in Cisco DNA Center
-            if device.reachabilityStatus == "Reachable":
-                device.status = DeviceStatusChoices.STATUS_ACTIVE
-            else:
-                device.status = DeviceStatusChoices.STATUS_FAILED
-
-            # Gather Device in Netbox
-            if Device.objects.filter(serial=device.serialNumber).exists() is False:
-                if Device.objects.filter(
-                    primary_ip4=device.primary_ip4,
-                    tenant=Tenant.objects.get(name=tenant).id,
-                ).exists():
-                    # There can't be duplicate IPs in one tenant.
-                    # But DNAC can register duplicate IPs, if only one is Reachable (within DNAC)
-                    Device.objects.create(
-                        name=device.hostname,
-                        device_role=device.role,
-                        device_type=device.family_type,
-                        serial=device.serialNumber,
-                        status=device.status,
-                        site=device.site,
-                        comments="Managed by {}".format(tenant),
-                        tenant=Tenant.objects.get(name=tenant),
-                    )
-                    sync = "Error"
-                    return Device.objects.get(serial=device.serialNumber), sync
+            create = []
+            update = []
+            for device in devices:
+
+                # Match size in NetBox Database
+                device.hostname = device.hostname[0:100]
+                device.serialNumber = device.serialNumber[0:50]
+
+                # Check device reachability in Cisco DNA Center
+                if device.reachabilityStatus == "Reachable":
+                    device.status = DeviceStatusChoices.STATUS_ACTIVE
                 else:
-                    Device.objects.create(
-                        name=device.hostname,
-                        device_role=device.role,
-                        device_type=device.family_type,
-                        primary_ip4=device.primary_ip4,
-                        serial=device.serialNumber,
-                        status=device.status,
-                        site=device.site,
-                        comments="Managed by {}".format(tenant),
-                        tenant=Tenant.objects.get(name=tenant),
-                    )
+                    device.status = DeviceStatusChoices.STATUS_FAILED
+
+                if device.serialNumber in existing:
+                    __obj = existing[device.serialNumber]
+                    sync = "Updated"
+                    update.append(__obj)
+                else:
+                    __obj = Device(serial=device.serialNumber, tenant=context.tenant)
                     sync = "Created"
-            else:
+                    create.append(__obj)
+                __obj.name = device.hostname
+                __obj.device_role = device.device_role
+                __obj.device_type = device.family_type
+                __obj.status = device.status
+                __obj.site = device.site
+                if context.hierarchy:
+                    __obj.location = device.location
+                __obj.comments = "Managed by {}".format(context.name)
+
+                # There can't be duplicate IPs in one tenant.
+                # But DNAC can register duplicate IPs, if only one is Reachable (within DNAC)
+                owner = owners.get(device.primary_ip4.id)
+                if owner is None or owner == device.serialNumber:
+                    __obj.primary_ip4 = device.primary_ip4
+                    owners[device.primary_ip4.id] = device.serialNumber
+                else:
+                    sync = "Error"
+                results[device.serialNumber] = [__obj, sync]
+
+            # Write Devices in chunks
+            fields = [
+                "name",
+                "device_role",
+                "device_type",
+                "primary_ip4",
+                "status",
+                "site",
+                "comments",
+                "_name",
+            ]
+            if context.hierarchy:
+                fields.append("location")
+            Netbox.Sync.naturalize(Device, update)
+            for i in range(0, len(create), batch_size):
+                chunk = create[i : i + batch_size]
                 try:
-                    # There can't be duplicate IPs in one tenant.
-                    # But DNAC can register duplicate IPs, if only one is Reachable (within DNAC)
-                    device.serialNumber = Device.objects.get(
-                        primary_ip4=device.primary_ip4,
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    ).serial
-                    Device.objects.filter(
-                        serial=device.serialNumber,
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    ).update(
-                        name=device.hostname,
-                        device_role=device.role,
-                        device_type=device.family_type,
-                        primary_ip4=device.primary_ip4,
-                        status=device.status,
-                        site=device.site,
-                        comments="Managed by {}".format(tenant),
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    )
-                    sync = "Updated"
+                    with transaction.atomic():
+                        Device.objects.bulk_create(chunk)
                 except Exception as error_msg:
+                    # Retry one by one, so that only the bad Device fails
                     print(error_msg)
-                    Device.objects.filter(
-                        serial=device.serialNumber,
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    ).update(
-                        name=device.hostname,
-                        device_role=device.role,
-                        device_type=device.family_type,
-                        status=device.status,
-                        site=device.site,
-                        comments="Managed by {}".format(tenant),
-                        tenant=Tenant.objects.get(name=tenant).id,
-                    )
-                    sync = "Error"
-                    pass
+                    for __obj in chunk:
+                        try:
+                            with transaction.atomic():
+                                __obj.save()
+                        except Exception as error_msg:
+                            print("Error for {}: {}".format(__obj.serial, error_msg))
+                            __obj.pk = None
+                            results[__obj.serial][1] = "Error"
+            for i in range(0, len(update), batch_size):
+                chunk = update[i : i + batch_size]
+                try:
+                    with transaction.atomic():
+                        Device.objects.bulk_update(chunk, fields)
+                except Exception as error_msg:
+                    print(error_msg)
+                    for __obj in chunk:
+                        try:
+                            with transaction.atomic():
+                                __obj.save()
+                        except Exception as error_msg:
+                            print("Error for {}: {}".format(__obj.serial, error_msg))
+                            results[__obj.serial][1] = "Error"
+
+            # Keep the Context in line with NetBox
+            for __obj in create:
+                if __obj.pk is not None:
+                    existing[__obj.serial] = __obj
 
             # Assign IP Address to Device in NetBox
-            IPAddress.objects.filter(
-                address=str(device.primary_ip4),
-                tenant=Tenant.objects.get(name=tenant).id,
-            ).update(
-                assigned_object_id=Device.objects.get(serial=device.serialNumber).id,
+            addresses = []
+            for __obj, sync in results.values():
+                if __obj.pk is not None and __obj.primary_ip4 is not None:
+                    if __obj.primary_ip4.assigned_object_id != __obj.pk:
+                        __obj.primary_ip4.assigned_object_id = __obj.pk
+                        addresses.append(__obj.primary_ip4)
+            IPAddress.objects.bulk_update(
+                addresses, ["assigned_object_id"], batch_size=batch_size
             )
 
-            return Device.objects.get(serial=device.serialNumber), sync
+            return {serial: tuple(result) for serial, result in results.items()}
 
         @staticmethod
-        def ipaddress(tenant, address, hostname):
+        def ipaddress(context, address, hostname):
             """
             Handle IPAddress operations with NetBox
             """
             # Gather IPAddress in Netbox
-            if (
-                IPAddress.objects.filter(
-                    address=address, tenant=Tenant.objects.get(name=tenant).id
-                ).exists()
-                is False
-            ):
-                IPAddress.objects.create(
+            key = str(ipaddress.ip_interface(address))
+            __obj = context.ipaddresses.get(key)
+            description = "Managed by {}".format(context.name)
+            if __obj is None:
+                __obj = IPAddress.objects.create(
                     address=address,
                     status=DeviceStatusChoices.STATUS_ACTIVE,
                     dns_name=hostname,
-                    description="Managed by {}".format(tenant),
-                    tenant=Tenant.objects.get(name=tenant),
+                    description=description,
+                    tenant=context.tenant,
                 )
-            else:
-                IPAddress.objects.filter(
-                    address=address, tenant=Tenant.objects.get(name=tenant).id
-                ).update(
+                context.ipaddresses[key] = __obj
+            elif (
+                __obj.status != DeviceStatusChoices.STATUS_ACTIVE
+                or __obj.dns_name != hostname
+                or __obj.description != description
+            ):
+                IPAddress.objects.filter(pk=__obj.pk).update(
                     status=DeviceStatusChoices.STATUS_ACTIVE,
                     dns_name=hostname,
-                    description="Managed by {}".format(tenant),
-                    tenant=Tenant.objects.get(name=tenant).id,
+                    description=description,
                 )
+                __obj.status = DeviceStatusChoices.STATUS_ACTIVE
+                __obj.dns_name = hostname
+                __obj.description = description
+            return __obj
+
+        @staticmethod
+        def fingerprints(context, type, digests):
+            """
+            Handle Fingerprint operations with NetBox
+
+            `digests` holds every key that is in sync with Cisco DNA Center,
+            Fingerprints for any other key (removed or failed) are deleted.
+            """
+            batch_size = System.Config.get("bulk_batch_size")
+            create = []
+            update = []
+            for key, digest in digests.items():
+                __obj = context.fingerprints.get((type, key))
+                if __obj is None:
+                    __obj = Fingerprint(
+                        settings=context.settings, type=type, key=key, digest=digest
+                    )
+                    context.fingerprints[(type, key)] = __obj
+                    create.append(__obj)
+                elif __obj.digest != digest:
+                    __obj.digest = digest
+                    __obj.last_updated = timezone.now()
+                    update.append(__obj)
+            Fingerprint.objects.bulk_create(create, batch_size=batch_size)
+            Fingerprint.objects.bulk_update(
+                update, ["digest", "last_updated"], batch_size=batch_size
+            )
+            Fingerprint.objects.filter(settings=context.settings, type=type).exclude(
+                key__in=list(digests)
+            ).delete()
+            for key in [k for k in context.fingerprints if k[0] == type]:
+                if key[1] not in digests:
+                    del context.fingerprints[key]
 
-            for v in IPAddress.objects.filter(address=address):
-                if tenant == v.tenant:
-                    return IPAddress.objects.get(id=v.id)
-            return IPAddress.objects.get(
-                address=address, tenant=Tenant.objects.get(name=tenant).id
+        @staticmethod
+        def fingerprint(context, type, key, digest=None):
+            """
+            Handle the Fingerprint of a single object, deleted without `digest`
+            """
+            if digest is None:
+                Fingerprint.objects.filter(
+                    settings=context.settings, type=type, key=key
+                ).delete()
+                return
+            Fingerprint.objects.update_or_create(
+                settings=context.settings,
+                type=type,
+                key=key,
+                defaults={"digest": digest},
             )
 
     class Purge:
@@ -360,82 +1004,51 @@ class Netbox:
         def database(**kwargs):
             """
             Purge data from NetBox Database - when running Sync
+
+            Returns the deleted objects (name and serial or slug), recorded
+            with the Sync Run.
             """
+            context = kwargs["context"]
 
-            # Delete devices related to Tenant
+            # Delete devices related to Tenant (unique Serial Numbers)
             if kwargs["type"] == "devices":
-
-                # Unique Serial Numbers in Netbox
-                netbox_serials = [
-                    d.serial
-                    for d in Device.objects.filter(
-                        tenant=Tenant.objects.get(name=kwargs["tenant"]).id
-                    )
+                model = Device
+                keys = {"serial__in": [d["serial"] for d in kwargs["data"]]}
+            # Delete sites, regions or locations related to Tenant (unique slug/uuid)
+            elif kwargs["type"] in ["sites", "regions", "locations"]:
+                model = {"sites": Site, "regions": Region, "locations": Location}[
+                    kwargs["type"]
                 ]
+                keys = {"slug__in": [s["slug"] for s in kwargs["data"]]}
+            else:
+                raise Exception("Not implemented yet")
 
-                # Unique Serial Numbers in Cisco DNA Center Instance
-                dnac_serials = []
-                for d in kwargs["data"]:
-                    dnac_serials.append(d["serial"])
-
-                # Diff between NetBox and Cisco DNA Center Instance
-                purge = list(set(netbox_serials) - set(dnac_serials))
-
-                if len(purge) == 0:
-                    return False
-                else:
+            # Diff between NetBox and Cisco DNA Center Instance (in the database)
+            key = "serial" if model is Device else "slug"
+            purge = list(
+                context.managed(model).exclude(**keys).values("pk", key, "name")
+            )
 
-                    # Remove diff in NetBox
-                    try:
-                        for serial in purge:
-                            Device.objects.filter(
-                                id=Device.objects.get(serial=serial).id
-                            ).delete()
-                        return True
-                    except Exception as error_msg:
-                        print(
-                            "Error couldn't delete {}\n{}".format(
-                                kwargs["data"], error_msg
-                            )
-                        )
-                        return False
-            # Delete sites related to Tenant
-            elif kwargs["type"] == "sites":
-
-                # Unique slug/uuid in NetBox
-                netbox_sites = [
-                    s.slug
-                    for s in Site.objects.filter(
-                        tenant=Tenant.objects.get(name=kwargs["tenant"]).id
+            # Remove diff in NetBox, a failed chunk doesn't stop the others
+            deleted = []
+            batch_size = System.Config.get("bulk_batch_size")
+            for i in range(0, len(purge), batch_size):
+                chunk = [__obj["pk"] for __obj in purge[i : i + batch_size]]
+                try:
+                    with transaction.atomic():
+                        model.objects.filter(pk__in=chunk).delete()
+                except Exception as error_msg:
+                    print("Error couldn't delete {}\n{}".format(chunk, error_msg))
+                    continue
+                for __obj in purge[i : i + batch_size]:
+                    deleted.append(
+                        {
+                            "name": __obj["name"],
+                            key: __obj[key],
+                            "sync_status": "Deleted",
+                        }
                     )
-                ]
-
-                # Unique Site id/uuid in Cisco DNA Center Instance
-                dnac_sites = []
-                for s in kwargs["data"]:
-                    dnac_sites.append(s["slug"])
-
-                # Diff between NetBox and Cisco DNA Center Instance
-                purge = list(set(netbox_sites) - set(dnac_sites))
-
-                if len(purge) == 0:
-                    return False
-                else:
-
-                    # Remove diff in NetBox
-                    try:
-                        for uuid in purge:
-                            Site.objects.filter(slug=uuid).delete()
-                        return True
-                    except Exception as error_msg:
-                        print(
-                            "Error couldn't delete {}\n{}".format(
-                                kwargs["data"], error_msg
-                            )
-                        )
-                        return False
-            else:
-                raise Exception("Not implemented yet")
+            return deleted
 
         @classmethod
         def tenant(cls, **kwargs):
@@ -453,6 +1066,7 @@ class Netbox:
             results[tenant_name]["devices"] = cls.devices(**kwargs)
             results[tenant_name]["ipaddress"] = cls.ipaddress(**kwargs)
             results[tenant_name]["sites"] = cls.sites(**kwargs)
+            results[tenant_name]["regions"] = cls.regions(tenant=tenant_name)
             Tenant.objects.filter(pk=kwargs["pk"]).delete()
 
             return results
@@ -483,3 +1097,15 @@ class Netbox:
             result = Site.objects.filter(tenant=kwargs["pk"]).count()
             Site.objects.filter(tenant=kwargs["pk"]).delete()
             return result
+
+        @classmethod
+        def regions(cls, **kwargs):
+            """
+            Delete Regions related to Cisco DNA Center Instance (`site_hierarchy`)
+            """
+            regions = Region.objects.filter(
+                description="Managed by {}".format(kwargs["tenant"])
+            )
+            result = regions.count()
+            regions.delete()
+            return result
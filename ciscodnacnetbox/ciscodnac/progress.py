@@ -0,0 +1,139 @@
+import json
+import time
+from django_rq import get_connection, get_queue
+from .utilities import System
+
+
+class Progress:
+    """
+    Progress of a Sync stage, published to the page waiting for the RQ job
+
+    The last event per Tenant and stage is kept in a Redis hash, the
+    snapshot returned with the job status the page polls. With
+    `progress_sse` it's also announced on a pub/sub channel of the same
+    name and pushed to the page with Server-Sent Events.
+    """
+
+    # Seconds between two events of the same stage
+    interval = 0.5
+
+    def __init__(self, id=None):
+        self.id = id
+        self.published = {}
+
+    @property
+    def enabled(self):
+        return self.id is not None
+
+    @staticmethod
+    def key(id):
+        return "ciscodnacnetbox_progress_{}".format(id)
+
+    def update(self, tenant, stage, step, done=0, total=None, final=False):
+        """
+        Items `done` out of `total` (None if unknown) in a step of the stage
+        """
+        if self.enabled is False:
+            return
+        field = "{}:{}".format(tenant, stage)
+        now = time.monotonic()
+        if final is False and now - self.published.get(field, 0.0) < self.interval:
+            return
+        self.published[field] = now
+        self.publish(
+            self.id,
+            field,
+            {
+                "tenant": tenant,
+                "stage": stage,
+                "step": step,
+                "done": done,
+                "total": total,
+            },
+        )
+
+    @classmethod
+    def publish(cls, id, field, event):
+        key = cls.key(id)
+        message = json.dumps(event)
+        pipe = get_connection("default").pipeline()
+        pipe.hset(key, field, message)
+        pipe.expire(key, System.Config.get("sync_timeout"))
+        if System.Config.get("progress_sse"):
+            pipe.publish(key, message)
+        pipe.execute()
+
+    @classmethod
+    def finish(cls, id):
+        """
+        The RQ job is about to return, the page can load the results
+        """
+        cls.publish(id, "job", {"status": "finished"})
+
+    @classmethod
+    def snapshot(cls, id):
+        """
+        Last event per Tenant and stage of a RQ job
+        """
+        return [
+            json.loads(message)
+            for field, message in get_connection("default").hgetall(cls.key(id)).items()
+            if field != b"job"
+        ]
+
+    @staticmethod
+    def status(id, wait=0):
+        """
+        Status of the RQ job, waits up to `wait` seconds for it to end
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            j = get_queue("default").fetch_job(str(id))
+            if j is None:
+                return None
+            status = str(j.get_status())
+            if status in ["finished", "failed"] or time.monotonic() >= deadline:
+                return status
+            time.sleep(0.1)
+
+    @classmethod
+    def stream(cls, id, timeout=30, keepalive=15):
+        """
+        Server-Sent Events of a RQ job, ends with the status of the job
+
+        The stream is closed after `timeout` seconds and the browser
+        reconnects. Each open page holds a web worker, only enabled by
+        `progress_sse` for async or gevent workers.
+        """
+        pubsub = get_connection("default").pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(cls.key(id))
+        try:
+            yield "retry: 1000\n\n"
+
+            # Current progress, subscribed first so that no event is missed
+            for event in cls.snapshot(id):
+                yield "data: {}\n\n".format(json.dumps(event))
+
+            deadline = time.monotonic() + timeout
+            status = cls.status(id)
+            while status not in [None, "finished", "failed"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                message = pubsub.get_message(timeout=min(keepalive, remaining))
+                if message is None:
+                    # Jobs that fail don't publish, check once in a while
+                    yield ": keep-alive\n\n"
+                    status = cls.status(id)
+                    continue
+                event = json.loads(message["data"])
+                if "status" in event:
+                    # Published just before RQ stores the result
+                    status = cls.status(id, wait=5)
+                    break
+                yield "data: {}\n\n".format(message["data"].decode())
+            yield "event: status\ndata: {}\n\n".format(
+                json.dumps({"id": str(id), "status": status})
+            )
+        finally:
+            pubsub.close()
@@ -0,0 +1,87 @@
+import math
+from django.core.cache import cache
+from django.utils import timezone
+from ..models import Settings
+from .utilities import System
+
+
+class Scheduler:
+    """
+    Periodic Sync of Cisco DNA Center Instances, on the RQ queue
+
+    A Tenant with a `sync_interval` is synced once per interval, in its own
+    slot. Slots are offset per Tenant (golden ratio of the pk), so that the
+    Cisco DNA Center and database load is spread evenly over the interval
+    instead of every Tenant syncing in the same minute.
+    """
+
+    # Fractional part of the golden ratio, spreads consecutive pks evenly
+    PHASE = (math.sqrt(5) - 1) / 2
+
+    @classmethod
+    def slot(cls, tenant, now):
+        """
+        Start of the current slot of a Tenant (epoch seconds)
+        """
+        interval = tenant.sync_interval * 60
+        phase = (tenant.pk * cls.PHASE) % 1 * interval
+        return int(math.floor((now.timestamp() - phase) / interval) * interval + phase)
+
+    @classmethod
+    def due(cls, tenant, now):
+        """
+        Tenants are skipped if already scheduled in this slot, synced within
+        the last half interval, still syncing, or the slot is half over
+        """
+        half = tenant.sync_interval * 30
+        slot = cls.slot(tenant, now)
+        if now.timestamp() - slot > half:
+            return False
+        if cache.get("ciscodnacnetbox_scheduled_{}".format(tenant.pk)) == slot:
+            return False
+        if tenant.last_synced is not None:
+            if (now - tenant.last_synced).total_seconds() < half:
+                return False
+        if cache.get("ciscodnacnetbox_lock_{}".format(tenant.pk)) is not None:
+            return False
+        return True
+
+    @classmethod
+    def tick(cls):
+        """
+        Tenants to sync now, marked as scheduled for their current slot
+        """
+        now = timezone.now()
+        tenants = []
+        for tenant in Settings.objects.filter(status=True, sync_interval__gt=0):
+            if cls.due(tenant, now):
+                cache.set(
+                    "ciscodnacnetbox_scheduled_{}".format(tenant.pk),
+                    cls.slot(tenant, now),
+                    timeout=tenant.sync_interval * 60,
+                )
+                tenants.append(tenant)
+        return tenants
+
+    @staticmethod
+    def acquire():
+        """
+        Only one chain of ticks, a second chain stops at its next tick
+        """
+        period = System.Config.get("scheduler_tick")
+        return cache.add("ciscodnacnetbox_scheduler", True, timeout=max(1, period - 1))
+
+    @staticmethod
+    def running():
+        """
+        A tick ran recently, the chain is alive
+        """
+        return cache.get("ciscodnacnetbox_scheduler_alive") is not None
+
+    @staticmethod
+    def alive():
+        cache.set(
+            "ciscodnacnetbox_scheduler_alive",
+            True,
+            timeout=3 * System.Config.get("scheduler_tick"),
+        )
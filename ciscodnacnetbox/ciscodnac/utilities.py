@@ -1,9 +1,13 @@
+import hashlib
+import json
 import re
+from django.conf import settings
 from django_rq import get_worker
 from django_rq.queues import get_connection
 from extras.models import Tag
 from dcim.models import Site
 from tenancy.models import Tenant
+from ..metadata import App
 
 
 class System:
@@ -11,6 +15,11 @@ class System:
     Support functions for the Plugin
     """
 
+    class Config:
+        @staticmethod
+        def get(key):
+            return settings.PLUGINS_CONFIG[App._NAME_][key]
+
     class Check:
         @classmethod
         def tenant(cls, tenant):
@@ -33,6 +42,12 @@ class System:
         def filter():
             return Tag.objects.filter(slug="cisco-dna-center")
 
+    class Fingerprint:
+        @staticmethod
+        def create(*values):
+            values = json.dumps(values, sort_keys=True, default=str)
+            return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
     class Slug:
         def create(input):
             return re.sub(r"[\s\/]+", "-", input).lower()
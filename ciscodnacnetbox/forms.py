@@ -1,5 +1,7 @@
+from django import forms
 from utilities.forms import StaticSelect
 from netbox.forms import NetBoxModelForm
+from .ciscodnac.aio import AsyncClient
 from .models import Settings
 
 
@@ -13,8 +15,11 @@ class SettingsForm(NetBoxModelForm):
             "version",
             "verify",
             "status",
+            "client",
+            "sync_interval",
         ]
         widgets = {
+            "client": StaticSelect(),
             "status": StaticSelect(
                 choices=(
                     ("True", "Yes"),
@@ -28,3 +33,12 @@ class SettingsForm(NetBoxModelForm):
                 )
             ),
         }
+
+    def clean_client(self):
+        # Without httpx the asyncio Client would silently be dnacentersdk
+        client = self.cleaned_data["client"]
+        if client == "async" and AsyncClient.available() is False:
+            raise forms.ValidationError(
+                "httpx is not installed (pip install ciscodnacnetbox[async])"
+            )
+        return client
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from ...ciscodnac.data import schedule_sync
+from ...ciscodnac.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = "Start the scheduler of the Cisco DNA Center Sync (RQ job)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Queue a tick even if the scheduler seems to be running",
+        )
+
+    def handle(self, *args, **options):
+        if Scheduler.running() and options["force"] is False:
+            self.stdout.write("Scheduler is already running")
+            return
+        Scheduler.alive()
+        schedule_sync.delay()
+        self.stdout.write("Scheduler started, rqworker must run with the scheduler")
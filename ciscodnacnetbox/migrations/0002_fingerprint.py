@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ciscodnacnetbox", "0001_initial"),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name="Fingerprint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                ("type", models.CharField(max_length=10)),
+                ("key", models.CharField(max_length=100)),
+                ("digest", models.CharField(max_length=40)),
+                ("last_updated", models.DateTimeField(auto_now=True)),
+                (
+                    "settings",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fingerprints",
+                        to="ciscodnacnetbox.settings",
+                    ),
+                ),
+            ],
+            options={
+                "app_label": "ciscodnacnetbox",
+                "unique_together": {("settings", "type", "key")},
+            },
+        ),
+    ]
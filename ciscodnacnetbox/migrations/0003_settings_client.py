@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ciscodnacnetbox", "0002_fingerprint"),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name="settings",
+            name="client",
+            field=models.CharField(
+                choices=[("sdk", "dnacentersdk"), ("async", "asyncio (httpx)")],
+                default="sdk",
+                max_length=10,
+            ),
+        ),
+    ]
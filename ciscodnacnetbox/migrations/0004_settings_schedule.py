@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ciscodnacnetbox", "0003_settings_client"),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name="settings",
+            name="sync_interval",
+            field=models.PositiveIntegerField(
+                blank=True,
+                null=True,
+                help_text="Minutes between scheduled syncs, empty to disable",
+            ),
+        ),
+        migrations.AddField(
+            model_name="settings",
+            name="last_synced",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
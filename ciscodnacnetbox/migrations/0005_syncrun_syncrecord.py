@@ -0,0 +1,74 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ciscodnacnetbox", "0004_settings_schedule"),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name="SyncRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("completed", models.DateTimeField(blank=True, null=True)),
+                ("kind", models.CharField(max_length=10)),
+                ("status", models.CharField(default="running", max_length=10)),
+                (
+                    "job_id",
+                    models.CharField(
+                        blank=True, db_index=True, max_length=36, null=True
+                    ),
+                ),
+                ("counters", models.JSONField(default=dict)),
+            ],
+            options={
+                "app_label": "ciscodnacnetbox",
+                "ordering": ["-created"],
+            },
+        ),
+        migrations.CreateModel(
+            name="SyncRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                ("tenant", models.CharField(max_length=255)),
+                ("type", models.CharField(max_length=10)),
+                ("key", models.CharField(max_length=100)),
+                ("name", models.CharField(blank=True, max_length=100)),
+                ("status", models.CharField(blank=True, max_length=50)),
+                ("status_label", models.CharField(blank=True, max_length=10)),
+                ("sync_status", models.CharField(max_length=200)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="records",
+                        to="ciscodnacnetbox.syncrun",
+                    ),
+                ),
+            ],
+            options={
+                "app_label": "ciscodnacnetbox",
+                "ordering": ["pk"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="syncrecord",
+            index=models.Index(fields=["run", "type"], name="ciscodnacnetbox_run_type"),
+        ),
+        migrations.AddIndex(
+            model_name="syncrecord",
+            index=models.Index(fields=["type", "key"], name="ciscodnacnetbox_type_key"),
+        ),
+    ]
@@ -21,6 +21,17 @@ class Settings(ChangeLoggingMixin, models.Model):
     version = models.CharField(max_length=10)
     verify = models.BooleanField(default=False)
     status = models.BooleanField(default=True)
+    client = models.CharField(
+        max_length=10,
+        choices=[("sdk", "dnacentersdk"), ("async", "asyncio (httpx)")],
+        default="sdk",
+    )
+    sync_interval = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Minutes between scheduled syncs, empty to disable",
+    )
+    last_synced = models.DateTimeField(blank=True, null=True, editable=False)
     objects = RestrictedQuerySet.as_manager()
 
     class Meta:
@@ -32,3 +43,68 @@ class Settings(ChangeLoggingMixin, models.Model):
 
     def get_absolute_url(self):
         return reverse("plugins:ciscodnacnetbox:settings")
+
+
+class Fingerprint(models.Model):
+    settings = models.ForeignKey(
+        Settings, on_delete=models.CASCADE, related_name="fingerprints"
+    )
+    type = models.CharField(max_length=10)
+    key = models.CharField(max_length=100)
+    digest = models.CharField(max_length=40)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "ciscodnacnetbox"
+        unique_together = ["settings", "type", "key"]
+
+    def __str__(self):
+        return "{} {}".format(self.type, self.key)
+
+
+class SyncRun(models.Model):
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed = models.DateTimeField(blank=True, null=True)
+    # full, sites, devices or event
+    kind = models.CharField(max_length=10)
+    # running, finished or failed
+    status = models.CharField(max_length=10, default="running")
+    job_id = models.CharField(max_length=36, blank=True, null=True, db_index=True)
+    # Counters per Tenant and stage, no objects
+    counters = models.JSONField(default=dict)
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        app_label = "ciscodnacnetbox"
+        ordering = ["-created"]
+
+    def __str__(self):
+        return "{} sync #{}".format(self.kind, self.pk)
+
+    def get_absolute_url(self):
+        return reverse("plugins:ciscodnacnetbox:syncrun", args=[self.pk])
+
+
+class SyncRecord(models.Model):
+    run = models.ForeignKey(SyncRun, on_delete=models.CASCADE, related_name="records")
+    tenant = models.CharField(max_length=255)
+    # site or device
+    type = models.CharField(max_length=10)
+    # Slug of a Site, Serial Number of a Device
+    key = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    status_label = models.CharField(max_length=10, blank=True)
+    sync_status = models.CharField(max_length=200)
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        app_label = "ciscodnacnetbox"
+        ordering = ["pk"]
+        indexes = [
+            models.Index(fields=["run", "type"], name="ciscodnacnetbox_run_type"),
+            models.Index(fields=["type", "key"], name="ciscodnacnetbox_type_key"),
+        ]
+
+    def __str__(self):
+        return "{} {}".format(self.type, self.key)
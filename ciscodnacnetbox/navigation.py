@@ -24,4 +24,9 @@ menu_items = (
             ),
         ),
     ),
+    PluginMenuItem(
+        link="plugins:ciscodnacnetbox:syncruns",
+        link_text="Sync History",
+        permissions=["ciscodnacnetbox.view_syncrun"],
+    ),
 )
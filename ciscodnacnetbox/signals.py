@@ -0,0 +1,21 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .ciscodnac import CiscoDNAC
+from .models import Settings
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def settings_changed(instance, **kwargs):
+    """
+    Drop cached Cisco DNA Center API Client, Status and Inventory when Settings are edited
+    """
+    CiscoDNAC.invalidate(instance.pk)
+    cache.delete("ciscodnacnetbox_status")
+    cache.delete_many(
+        [
+            "ciscodnacnetbox_inventory_{}_{}".format(kind, instance.hostname)
+            for kind in ("devices", "sites")
+        ]
+    )
@@ -1,7 +1,10 @@
 import django_tables2 as tables
+from django_tables2 import RequestConfig
 from django_tables2.utils import A
+from django.db.models import Q, QuerySet
 from django.utils.safestring import mark_safe
 from netbox.tables import NetBoxTable, columns
+from utilities.paginator import EnhancedPaginator, get_paginate_count
 from .models import Settings
 
 
@@ -21,6 +24,9 @@ class SettingsTable(NetBoxTable):
     version = tables.Column()
     verify = columns.BooleanColumn()
     status = columns.BooleanColumn()
+    client = tables.Column()
+    sync_interval = tables.Column(verbose_name="Sync Interval (min)")
+    last_synced = columns.DateTimeColumn()
 
     class Meta(NetBoxTable.Meta):
         model = Settings
@@ -32,4 +38,137 @@ class SettingsTable(NetBoxTable):
             "version",
             "verify",
             "status",
+            "client",
+            "sync_interval",
+            "last_synced",
         ]
+
+
+class DataTable(tables.Table):
+    """
+    Table of cached Cisco DNA Center data (list of dicts) or Sync history
+
+    Searched, sorted and paginated by the server, so a page only renders
+    `per_page` rows.
+    """
+
+    # Columns searched by `?q=`
+    search_fields = []
+
+    class Meta:
+        attrs = {"class": "table table-hover table-headings"}
+
+    def __init__(self, data, query=None, **kwargs):
+        if query and isinstance(data, QuerySet):
+            search = Q()
+            for field in self.search_fields:
+                search |= Q(**{"{}__icontains".format(field): query})
+            data = data.filter(search)
+        elif query:
+            query = query.lower()
+            data = [
+                row
+                for row in data
+                if any(
+                    query in str(row.get(field) or "").lower()
+                    for field in self.search_fields
+                )
+            ]
+        super().__init__(data, **kwargs)
+
+    def configure(self, request):
+        RequestConfig(
+            request,
+            {
+                "paginator_class": EnhancedPaginator,
+                "per_page": get_paginate_count(request),
+            },
+        ).configure(self)
+        return self
+
+
+class StatusLabel(tables.TemplateColumn):
+    def __init__(self, **kwargs):
+        super().__init__(
+            template_code='<span class="label label-{{ record.status_label }}">{{ value }}</span>',
+            **kwargs
+        )
+
+
+class DeviceInventoryTable(DataTable):
+    tenant = tables.Column(verbose_name="Cisco DNA Center")
+    hostname = tables.Column(verbose_name="Name")
+    reachabilityStatus = tables.TemplateColumn(
+        verbose_name="Status",
+        template_code="""
+        {% if "Reachable" in value %}
+        <span class="label label-success">Reachable</span>
+        {% else %}
+        <span class="label label-danger">Unreachable</span>
+        {% endif %}
+        """,
+    )
+    role = tables.TemplateColumn(
+        template_code='<label class="label" style="color: #ffffff; background-color: #2196f3">{{ value }}</label>'
+    )
+    type = tables.Column()
+    platformId = tables.Column(verbose_name="Platform ID")
+    managementIpAddress = tables.Column(verbose_name="IP Address")
+    serialNumber = tables.Column(verbose_name="Serial Number")
+
+    search_fields = [
+        "hostname",
+        "role",
+        "type",
+        "platformId",
+        "managementIpAddress",
+        "serialNumber",
+    ]
+
+    class Meta(DataTable.Meta):
+        order_by = ("hostname",)
+
+
+class SiteInventoryTable(DataTable):
+    tenant = tables.Column(verbose_name="Cisco DNA Center")
+    name = tables.Column(verbose_name="Site")
+    siteNameHierarchy = tables.Column(verbose_name="Slug")
+    type = tables.TemplateColumn(
+        template_code='<span class="label label-primary">{{ value }}</span>'
+    )
+    country = tables.TemplateColumn(
+        template_code='<span class="label label-primary">{{ value }}</span>'
+    )
+
+    search_fields = ["name", "siteNameHierarchy", "type", "country"]
+
+    class Meta(DataTable.Meta):
+        order_by = ("siteNameHierarchy",)
+
+
+class SyncRunTable(DataTable):
+    pk = tables.Column(linkify=True, verbose_name="ID")
+    created = tables.DateTimeColumn()
+    completed = tables.DateTimeColumn()
+    kind = tables.Column()
+    status = tables.Column()
+    record_count = tables.Column(verbose_name="Objects")
+
+    search_fields = ["kind", "status"]
+
+    class Meta(DataTable.Meta):
+        order_by = ("-created",)
+
+
+class SyncRecordTable(DataTable):
+    tenant = tables.Column(verbose_name="Cisco DNA Center")
+    type = tables.Column()
+    name = tables.Column()
+    status = StatusLabel()
+    key = tables.Column(verbose_name="Slug / Serial Number")
+    sync_status = tables.Column(verbose_name="Sync Action")
+
+    search_fields = ["tenant", "name", "key", "sync_status"]
+
+    class Meta(DataTable.Meta):
+        order_by = ("name",)
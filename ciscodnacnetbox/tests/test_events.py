@@ -0,0 +1,43 @@
+import json
+from django.test import RequestFactory, SimpleTestCase
+from ..ciscodnac.events import Events
+from ..views import EventsView
+from .utils import config
+
+
+class EventsViewTest(SimpleTestCase):
+    """
+    Event Notifications webhook, rejected before any Cisco DNA Center call
+    """
+
+    def post(self, authorization=None):
+        headers = {}
+        if authorization is not None:
+            headers["HTTP_AUTHORIZATION"] = authorization
+        request = RequestFactory().post(
+            "/api/plugins/ciscodnacnetbox/events/?tenant=dnac.example.com",
+            data=json.dumps({"details": {"Device": "10.10.20.51"}}),
+            content_type="application/json",
+            **headers,
+        )
+        return EventsView.as_view()(request)
+
+    @config(events_secret=None)
+    def test_missing_secret(self):
+        self.assertFalse(Events.enabled())
+        for authorization in [None, "", "Bearer ", "Bearer None"]:
+            response = self.post(authorization)
+            self.assertEqual(response.status_code, 403)
+
+    @config(events_secret="s3cret")
+    def test_wrong_token(self):
+        for authorization in [None, "", "Bearer wrong", "s3cret2", "Bearer s3cre"]:
+            response = self.post(authorization)
+            self.assertEqual(response.status_code, 401)
+
+    @config(events_secret="s3cret")
+    def test_authorized(self):
+        request = RequestFactory().post("/", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertTrue(Events.authorized(request))
+        request = RequestFactory().post("/", HTTP_AUTHORIZATION="s3cret")
+        self.assertTrue(Events.authorized(request))
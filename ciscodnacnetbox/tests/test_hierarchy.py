@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase
+from ..ciscodnac.hierarchy import Hierarchy
+
+
+class Node(dict):
+    """
+    Cisco DNA Center Site, with attributes like the API objects
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    __setattr__ = dict.__setitem__
+
+
+def site(id, name, type=None, parent=None):
+    info = []
+    if type is not None:
+        info.append({"nameSpace": "Location", "attributes": {"type": type}})
+    return Node(id=id, name=name, parentId=parent, additionalInfo=info)
+
+
+class HierarchyTest(SimpleTestCase):
+    """
+    Areas, buildings and floors of Cisco DNA Center as a tree
+    """
+
+    def setUp(self):
+        self.nodes = {
+            s.id: s
+            for s in [
+                site("global", "Global"),
+                site("emea", "EMEA", "area", "global"),
+                site("se", "Sweden", "area", "emea"),
+                site("hq", "HQ", "building", "se"),
+                site("f1", "Floor 1", "floor", "hq"),
+                site("lab", "Lab", "area", "global"),
+                site("lab2", "Lab", "area", "se"),
+                site("floating", "Floor 9", "floor", "global"),
+            ]
+        }
+
+    def test_levels(self):
+        tree = Hierarchy(list(self.nodes.values()))
+        n = self.nodes
+        self.assertEqual(tree.regions, [n["emea"], n["se"], n["lab"], n["lab2"]])
+        self.assertEqual(tree.sites, [n["hq"]])
+        self.assertEqual(tree.locations, [n["f1"]])
+        # A floor needs a building, `Global` isn't synced
+        self.assertEqual(tree.skipped, [n["floating"]])
+
+    def test_parents(self):
+        Hierarchy(list(self.nodes.values()))
+        n = self.nodes
+        self.assertEqual(
+            [n[k].depth for k in ["global", "emea", "se", "hq", "f1"]], [0, 1, 2, 3, 4]
+        )
+        self.assertIsNone(n["emea"].region)
+        self.assertEqual(n["se"].region, "emea")
+        self.assertEqual(n["hq"].region, "se")
+        self.assertEqual(n["f1"].region, "se")
+        self.assertEqual(n["f1"].building, "hq")
+        self.assertIsNone(n["hq"].building)
+
+    def test_children_first(self):
+        # Parents are resolved first, whatever the order of the response
+        tree = Hierarchy(list(reversed(list(self.nodes.values()))))
+        self.assertEqual(self.nodes["f1"].depth, 4)
+        self.assertEqual(tree.locations, [self.nodes["f1"]])
+
+    def test_unique(self):
+        Hierarchy(list(self.nodes.values()))
+        self.assertTrue(self.nodes["emea"].unique)
+        self.assertFalse(self.nodes["lab"].unique)
+        self.assertFalse(self.nodes["lab2"].unique)
+
+    def test_path(self):
+        tree = Hierarchy(list(self.nodes.values()))
+        self.assertEqual(
+            [s.id for s in tree.path(self.nodes["f1"])],
+            ["global", "emea", "se", "hq", "f1"],
+        )
+
+    def test_own_parent(self):
+        loop = site("loop", "Loop", "area", "loop")
+        tree = Hierarchy([loop])
+        self.assertEqual(loop.depth, 0)
+        self.assertEqual(tree.regions, [loop])
+        self.assertEqual(tree.path(loop), [loop])
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+from django.test import SimpleTestCase
+from ..ciscodnac.limiter import Backoff, RateLimiter
+from .utils import config
+
+
+class RateLimiterTest(SimpleTestCase):
+    """
+    Pacing of the API calls to one Cisco DNA Center
+    """
+
+    def test_unlimited_until_429(self):
+        limiter = RateLimiter(None)
+        for i in range(100):
+            self.assertEqual(limiter.reserve(), 0.0)
+        self.assertFalse(limiter.paced)
+
+        # The requests of the last minute are the limit, then halved
+        limiter.throttled()
+        self.assertTrue(limiter.paced)
+        self.assertAlmostEqual(limiter.max_rate, 100 / 60)
+        self.assertAlmostEqual(limiter.rate, 100 / 120)
+        self.assertGreater(limiter.reserve(), 0.0)
+
+    def test_limit(self):
+        limiter = RateLimiter(120)
+        self.assertTrue(limiter.paced)
+        self.assertEqual(limiter.max_rate, 2.0)
+        # Burst of one second of requests, then paced
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertAlmostEqual(limiter.reserve(), 0.5, places=2)
+
+    def test_recovers(self):
+        limiter = RateLimiter(120)
+        limiter.throttled()
+        self.assertEqual(limiter.rate, 1.0)
+        # 1/20 of the limit per successful call, up to the limit
+        for i in range(9):
+            limiter.success()
+            self.assertLess(limiter.rate, limiter.max_rate)
+        for i in range(5):
+            limiter.success()
+        self.assertEqual(limiter.rate, limiter.max_rate)
+
+    def test_concurrent_429(self):
+        # Requests sent before the first 429 slow down the rate only once
+        limiter = RateLimiter(120)
+        for i in range(4):
+            limiter.throttled()
+        self.assertEqual(limiter.rate, 1.0)
+
+    def test_retry_after(self):
+        limiter = RateLimiter(120)
+        limiter.throttled(retry_after=10)
+        self.assertGreaterEqual(limiter.reserve(), 10.0)
+
+    def test_floor(self):
+        limiter = RateLimiter(120)
+        with mock.patch("time.monotonic", side_effect=range(1000, 2000)):
+            for i in range(100):
+                limiter.throttled()
+        self.assertEqual(limiter.rate, limiter.max_rate / 32)
+
+
+@config(backoff=1.0, backoff_max=60)
+class BackoffTest(SimpleTestCase):
+    """
+    Delay before retrying a throttled or failed API call
+    """
+
+    def test_full_jitter(self):
+        with mock.patch("random.uniform", side_effect=lambda a, b: b) as uniform:
+            self.assertEqual(Backoff.delay(0), 1.0)
+            self.assertEqual(Backoff.delay(3), 8.0)
+            uniform.assert_called_with(0, 8.0)
+
+    def test_cap(self):
+        with mock.patch("random.uniform", side_effect=lambda a, b: b):
+            self.assertEqual(Backoff.delay(10), 60)
+        for i in range(100):
+            self.assertTrue(0 <= Backoff.delay(10) <= 60)
+
+    def test_retry_after(self):
+        with mock.patch("random.uniform", side_effect=lambda a, b: a):
+            self.assertEqual(Backoff.delay(0, retry_after=5), 5)
+
+    def test_retry_after_header(self):
+        self.assertEqual(Backoff.retry_after({"Retry-After": "3"}), 3.0)
+        self.assertIsNone(Backoff.retry_after({}))
+        self.assertIsNone(Backoff.retry_after(None))
+        self.assertIsNone(Backoff.retry_after({"Retry-After": "soon"}))
+        date = datetime.now(timezone.utc) + timedelta(seconds=30)
+        seconds = Backoff.retry_after({"Retry-After": format_datetime(date)})
+        self.assertTrue(25 <= seconds <= 30)
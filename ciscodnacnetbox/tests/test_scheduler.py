@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from ..ciscodnac.scheduler import Scheduler
+
+
+def tenant(pk=1, interval=60, last_synced=None):
+    """
+    Settings of a Cisco DNA Center, only what the Scheduler reads
+    """
+    return SimpleNamespace(pk=pk, sync_interval=interval, last_synced=last_synced)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SchedulerTest(SimpleTestCase):
+    """
+    Slots of the periodic Sync per Cisco DNA Center
+    """
+
+    now = datetime(2022, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slot(self):
+        slot = Scheduler.slot(tenant(), self.now)
+        self.assertTrue(0 <= self.now.timestamp() - slot < 3600)
+        # Same slot within the interval, the next one after it
+        later = datetime.fromtimestamp(slot + 3599, tz=timezone.utc)
+        self.assertEqual(Scheduler.slot(tenant(), later), slot)
+        later = datetime.fromtimestamp(slot + 3601, tz=timezone.utc)
+        self.assertEqual(Scheduler.slot(tenant(), later), slot + 3600)
+
+    def test_spread(self):
+        # Consecutive Tenants start at different times of the interval
+        offsets = sorted(
+            Scheduler.slot(tenant(pk=pk), self.now) % 3600 for pk in range(1, 11)
+        )
+        gaps = [b - a for a, b in zip(offsets, offsets[1:])]
+        self.assertEqual(len(set(offsets)), 10)
+        self.assertGreater(min(gaps), 3600 / 10 / 4)
+
+    def start(self, t, seconds=0):
+        return datetime.fromtimestamp(
+            Scheduler.slot(t, self.now) + seconds, tz=timezone.utc
+        )
+
+    def test_due(self):
+        t = tenant()
+        self.assertTrue(Scheduler.due(t, self.start(t, 60)))
+        # The slot is half over
+        self.assertFalse(Scheduler.due(t, self.start(t, 1801)))
+
+    def test_scheduled(self):
+        t = tenant()
+        now = self.start(t, 60)
+        cache.set("ciscodnacnetbox_scheduled_1", Scheduler.slot(t, now))
+        self.assertFalse(Scheduler.due(t, now))
+
+    def test_synced_recently(self):
+        now = self.start(tenant(), 60)
+        t = tenant(last_synced=now - timedelta(minutes=10))
+        self.assertFalse(Scheduler.due(t, now))
+        t = tenant(last_synced=now - timedelta(minutes=40))
+        self.assertTrue(Scheduler.due(t, now))
+
+    def test_syncing(self):
+        t = tenant()
+        cache.set("ciscodnacnetbox_lock_1", True)
+        self.assertFalse(Scheduler.due(t, self.start(t, 60)))
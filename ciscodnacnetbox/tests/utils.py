@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.test import override_settings
+from ..metadata import App
+
+
+def config(**values):
+    """
+    Plugin settings with `values` instead of the configured ones
+    """
+    plugins = dict(settings.PLUGINS_CONFIG)
+    plugins[App._NAME_] = {**plugins.get(App._NAME_, {}), **values}
+    return override_settings(PLUGINS_CONFIG=plugins)
@@ -23,6 +23,7 @@ urlpatterns = (
     path("settings/<int:pk>/changelog/", ObjectChangeLogView.as_view(), name="settings_changelog", kwargs={"model": Settings}),
     # Status
     path("status/", views.StatusView.as_view(), name="status"),
+    path("metrics/", views.MetricsView.as_view(), name="metrics"),
     # Tenant Data
     path("devices/", views.DeviceView.as_view(), name="devices"),
     path("<int:pk>/devices/", views.DeviceView.as_view(), name="devices"),
@@ -37,6 +38,9 @@ urlpatterns = (
         name="sync_full_failed",
     ),
     path("sync/<int:pk>/full/", views.SyncFull.as_view(), name="sync_full"),
+    path("sync/plan/", views.SyncPlan.as_view(), name="sync_plan"),
+    path("sync/plan/<uuid:id>/", views.SyncPlan.as_view(), name="sync_plan"),
+    path("sync/<int:pk>/plan/", views.SyncPlan.as_view(), name="sync_plan"),
     path("sync/sites/", views.SyncSites.as_view(), name="sync_sites"),
     path("sync/<int:pk>/sites/", views.SyncSites.as_view(), name="sync_sites"),
     path(
@@ -49,8 +53,14 @@ urlpatterns = (
         views.SyncDevices.as_view(),
         name="sync_devices",
     ),
+    # Sync history
+    path("runs/", views.SyncRunsView.as_view(), name="syncruns"),
+    path("runs/<int:pk>/", views.SyncRunView.as_view(), name="syncrun"),
     # Jobs
     path("job/<uuid:id>/", views.JobStatus.as_view(), name="job_status"),
+    path(
+        "job/<uuid:id>/progress/", views.JobProgress.as_view(), name="job_progress"
+    ),
     # Purge
     path("purge/<int:pk>/tenant/", views.PurgeTenant.as_view(), name="purge_tenant"),
 )
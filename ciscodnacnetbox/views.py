@@ -1,22 +1,74 @@
+import json
 import platform
 from django.conf import settings
-from django.http import Http404, HttpResponseServerError, JsonResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseServerError,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.views.defaults import ERROR_500_TEMPLATE_NAME
 from django.template import loader
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, render, redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Count
 from django.views.generic import View
 from utilities.forms import ConfirmationForm
 from tenancy.models import Tenant
 from netbox.views import generic
-from .models import Settings
+from .models import Settings, SyncRun
 from .forms import SettingsForm
-from .tables import SettingsTable
+from .tables import (
+    DeviceInventoryTable,
+    SettingsTable,
+    SiteInventoryTable,
+    SyncRecordTable,
+    SyncRunTable,
+)
 from .ciscodnac.data import Data
+from .ciscodnac.events import Events
+from .ciscodnac.monitoring import Prometheus
 from .ciscodnac.netbox import Netbox
+from .ciscodnac.progress import Progress
 from .ciscodnac.utilities import System
 
 
+def rq_error():
+    """
+    Error page when no RQ workers are running
+    """
+    template = loader.get_template(ERROR_500_TEMPLATE_NAME)
+    error_msg = """
+    Addtional Workers not running for Background Tasks.
+    Verify that rqworker is running.
+    """
+    return HttpResponseServerError(
+        template.render(
+            {
+                "error": error_msg,
+                "exception": "ciscodnacnetbox plugin - RQ",
+                "netbox_version": settings.VERSION,
+                "python_version": platform.python_version(),
+            }
+        )
+    )
+
+
+def without_refresh(request):
+    """
+    Same page without `refresh`, so that it isn't sent again by the search,
+    sort and pagination links or by reloading the page
+    """
+    params = request.GET.copy()
+    params.pop("refresh", None)
+    if len(params) == 0:
+        return redirect(request.path)
+    return redirect("{}?{}".format(request.path, params.urlencode()))
+
+
 class SettingsView(generic.ObjectListView):
     """
     Cisco DNA Center Settings
@@ -67,7 +119,10 @@ class StatusView(View):
         if Settings.objects.filter().exists() is False:
             return redirect("/plugins/ciscodnacnetbox/settings/")
 
-        data = Data.status()
+        # Start the scheduler if a Settings has a sync interval
+        Data.schedule()
+
+        data = Data.status(refresh="refresh" in request.GET)
         return render(
             request,
             "ciscodnacnetbox/status.html",
@@ -77,10 +132,21 @@ class StatusView(View):
                 "netbox_sites": data["netbox"]["sites"],
                 "netbox_devices": data["netbox"]["devices"],
                 "netbox_tenants": data["netbox"]["tenants"],
+                "timestamp": data["timestamp"],
             },
         )
 
 
+class MetricsView(View):
+    """
+    Prometheus metrics of the Plugin
+    """
+
+    def get(self, request):
+        body, content_type = Prometheus.export()
+        return HttpResponse(body, content_type=content_type)
+
+
 class SyncFull(View):
     """
     Sync Cisco DNA Center
@@ -93,23 +159,10 @@ class SyncFull(View):
 
         # Check if RQ workers are running
         if System.RQ.status() is False:
-            template = loader.get_template(ERROR_500_TEMPLATE_NAME)
-            error_msg = """
-            Addtional Workers not running for Background Tasks.
-            Verify that rqworker is running.
-            """
-            return HttpResponseServerError(
-                template.render(
-                    {
-                        "error": error_msg,
-                        "exception": "ciscodnacnetbox plugin - RQ",
-                        "netbox_version": settings.VERSION,
-                        "python_version": platform.python_version(),
-                    }
-                )
-            )
+            return rq_error()
 
-        # Run Sync as Background Job in RQ
+        # Run Sync as Background Job in RQ (full reconcile if requested)
+        kwargs["reconcile"] = "reconcile" in request.GET
         data = Data.sync_full(**kwargs)
         if "id" in kwargs:
             if data is None:
@@ -126,6 +179,46 @@ class SyncFull(View):
             "ciscodnacnetbox/loading_job.html",
             {
                 "data": data,
+                "url": reverse("plugins:ciscodnacnetbox:sync_full"),
+                "sse": System.Config.get("progress_sse"),
+            },
+        )
+
+
+class SyncPlan(View):
+    """
+    Plan a Sync of Cisco DNA Center (dry run)
+    """
+
+    def get(self, request, **kwargs):
+        # Check that we have Cisco DNA Center settings
+        if Settings.objects.filter().exists() is False:
+            return redirect("/plugins/ciscodnacnetbox/settings/")
+
+        # Check if RQ workers are running
+        if System.RQ.status() is False:
+            return rq_error()
+
+        # Run Plan as Background Job in RQ (full reconcile if requested)
+        kwargs["reconcile"] = "reconcile" in request.GET
+        data = Data.sync_plan(**kwargs)
+        if "id" in kwargs:
+            if data is None:
+                raise Http404()
+            return render(
+                request,
+                "ciscodnacnetbox/sync_plan.html",
+                {
+                    "data": data,
+                },
+            )
+        return render(
+            request,
+            "ciscodnacnetbox/loading_job.html",
+            {
+                "data": data,
+                "url": reverse("plugins:ciscodnacnetbox:sync_plan"),
+                "sse": System.Config.get("progress_sse"),
             },
         )
 
@@ -158,18 +251,92 @@ class JobStatus(View):
         return JsonResponse(data)
 
 
+class JobProgress(View):
+    """
+    Stream the progress of a RQ Job (Server-Sent Events)
+    """
+
+    def get(self, request, id):
+        # Holds a web worker per open page, see `progress_sse`
+        if System.Config.get("progress_sse") is False:
+            raise Http404()
+        response = StreamingHttpResponse(
+            Progress.stream(id), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Don't buffer the events in a reverse proxy (nginx)
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class EventsView(View):
+    """
+    Cisco DNA Center Event Notifications (webhook), queues a targeted Sync
+    """
+
+    def post(self, request):
+        # Anyone could queue syncs and deletes without a secret
+        if Events.enabled() is False:
+            return JsonResponse(
+                {"error": "Event Notifications disabled, set events_secret"},
+                status=403,
+            )
+        if Events.authorized(request) is False:
+            return JsonResponse({"error": "Unauthorized"}, status=401)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+        # A single event or a list of events
+        results = []
+        for event in payload if isinstance(payload, list) else [payload]:
+            if not isinstance(event, dict):
+                continue
+            tenant = Events.tenant(request, event)
+            if tenant is None:
+                results.append({"error": "Cisco DNA Center not found"})
+                continue
+            for kind, key in Events.targets(event):
+                results.append(
+                    {
+                        "tenant": tenant.hostname,
+                        "kind": kind,
+                        "key": key,
+                        "queued": Data.event_enqueue(tenant.pk, kind, key),
+                    }
+                )
+        return JsonResponse({"events": results}, status=202)
+
+
 class DeviceView(View):
     """
     Cisco DNA Center Devices
     """
 
     def get(self, request, **kwargs):
+        if "refresh" in request.GET:
+            Data.devices(refresh=True, **kwargs)
+            return without_refresh(request)
         data = Data.devices(**kwargs)
+
+        # One page of all Cisco DNA Center Instances
+        rows = [
+            {"tenant": tenant, **item}
+            for tenant, inventory in data.items()
+            for item in inventory["items"]
+        ]
+        table = DeviceInventoryTable(rows, query=request.GET.get("q")).configure(
+            request
+        )
         return render(
             request,
             "ciscodnacnetbox/devices.html",
             {
                 "data": data,
+                "table": table,
+                "refreshing": any(d.get("refreshing") for d in data.values()),
             },
         )
 
@@ -180,14 +347,10 @@ class SyncDevices(View):
     """
 
     def get(self, request, **kwargs):
-        data = Data.sync_devices(**kwargs)
-        return render(
-            request,
-            "ciscodnacnetbox/sync_devices.html",
-            {
-                "data": data,
-            },
-        )
+        # Sync and redirect to the recorded Sync Run
+        kwargs["reconcile"] = "reconcile" in request.GET
+        run = Data.sync_run("devices", **kwargs)
+        return redirect(run.get_absolute_url())
 
 
 class SitesView(View):
@@ -196,12 +359,25 @@ class SitesView(View):
     """
 
     def get(self, request, **kwargs):
+        if "refresh" in request.GET:
+            Data.sites(refresh=True, **kwargs)
+            return without_refresh(request)
         data = Data.sites(**kwargs)
+
+        # One page of all Cisco DNA Center Instances
+        rows = [
+            {"tenant": tenant, **item}
+            for tenant, inventory in data.items()
+            for item in inventory["items"]
+        ]
+        table = SiteInventoryTable(rows, query=request.GET.get("q")).configure(request)
         return render(
             request,
             "ciscodnacnetbox/sites.html",
             {
                 "data": data,
+                "table": table,
+                "refreshing": any(d.get("refreshing") for d in data.values()),
             },
         )
 
@@ -212,12 +388,69 @@ class SyncSites(View):
     """
 
     def get(self, request, **kwargs):
-        data = Data.sync_sites(**kwargs)
+        # Sync and redirect to the recorded Sync Run
+        kwargs["reconcile"] = "reconcile" in request.GET
+        run = Data.sync_run("sites", **kwargs)
+        return redirect(run.get_absolute_url())
+
+
+class SyncRunsView(View):
+    """
+    History of the Sync Runs
+    """
+
+    def get(self, request):
+        runs = SyncRun.objects.restrict(request.user, "view").annotate(
+            record_count=Count("records")
+        )
+        table = SyncRunTable(runs, query=request.GET.get("q")).configure(request)
         return render(
             request,
-            "ciscodnacnetbox/sync_sites.html",
+            "ciscodnacnetbox/sync_runs.html",
             {
-                "data": data,
+                "table": table,
+            },
+        )
+
+
+class SyncRunView(View):
+    """
+    Sites and Devices of a Sync Run, one page at the time
+    """
+
+    def get(self, request, pk):
+        run = get_object_or_404(SyncRun.objects.restrict(request.user, "view"), pk=pk)
+        records = run.records.all()
+        if request.GET.get("type") in ["site", "device"]:
+            records = records.filter(type=request.GET["type"])
+        table = SyncRecordTable(records, query=request.GET.get("q")).configure(request)
+
+        # Outcomes per Tenant and type, counted by the database
+        summary = list(
+            run.records.values("tenant", "type", "sync_status").annotate(
+                count=Count("pk")
+            )
+        )
+        # Unchanged objects aren't recorded, only counted
+        for tenant, counters in run.counters.items():
+            for stage in ["sites", "devices"]:
+                if counters.get(stage + "_unchanged"):
+                    summary.append(
+                        {
+                            "tenant": tenant,
+                            "type": stage.rstrip("s"),
+                            "sync_status": "Unchanged",
+                            "count": counters[stage + "_unchanged"],
+                        }
+                    )
+        summary.sort(key=lambda row: (row["tenant"], row["type"], row["sync_status"]))
+        return render(
+            request,
+            "ciscodnacnetbox/sync_run.html",
+            {
+                "run": run,
+                "summary": summary,
+                "table": table,
             },
         )
 
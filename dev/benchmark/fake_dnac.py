@@ -0,0 +1,299 @@
+"""
+Local stand-in for Cisco DNA Center, serving synthetic Sites and Devices
+
+Only the API calls used by ciscodnacnetbox are served (auth, sites, site
+count, membership, device count and paginated devices). The data is generated from the
+number of Devices, so runs with the same size are comparable.
+
+    python dev/benchmark/fake_dnac.py --devices 5000 --port 8443
+"""
+
+import argparse
+import json
+import os
+import re
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class Dataset:
+    """
+    Synthetic Cisco DNA Center inventory
+
+    Global > Area > Building > Floor, with the Devices spread over the
+    Floors. The membership of a Site includes the Devices of its children,
+    like Cisco DNA Center does.
+    """
+
+    DEVICES_PER_FLOOR = 25
+    FLOORS_PER_BUILDING = 2
+    BUILDINGS_PER_AREA = 20
+
+    def __init__(self, devices):
+        self.sites = []
+        self.devices = []
+        self.members = {}
+        namespace = uuid.UUID("6f1c3c8e-1d1c-4e53-9a43-5d5b0c1a2f00")
+
+        def site(name, parent=None, type="area"):
+            obj = {
+                "id": str(uuid.uuid5(namespace, name)),
+                "name": name.split("/")[-1],
+                "siteNameHierarchy": name,
+                "parentId": parent["id"] if parent else None,
+                "additionalInfo": [],
+            }
+            if parent is not None:
+                obj["additionalInfo"].append(
+                    {
+                        "nameSpace": "Location",
+                        "attributes": {
+                            "address": "{} Bench Street".format(len(self.sites)),
+                            "latitude": "59.{:06d}".format(len(self.sites)),
+                            "longitude": "18.{:06d}".format(len(self.sites)),
+                            "type": type,
+                            "country": "Sweden",
+                        },
+                    }
+                )
+            self.sites.append(obj)
+            self.members[obj["id"]] = []
+            return obj
+
+        root = site("Global")
+        floors = max(1, -(-devices // self.DEVICES_PER_FLOOR))
+        buildings = -(-floors // self.FLOORS_PER_BUILDING)
+        areas = -(-buildings // self.BUILDINGS_PER_AREA)
+        parents = {}
+        for a in range(areas):
+            area = site("Global/Area {}".format(a), root)
+            for b in range(self.BUILDINGS_PER_AREA):
+                index = a * self.BUILDINGS_PER_AREA + b
+                if index >= buildings:
+                    break
+                building = site(
+                    "{}/Building {}".format(area["siteNameHierarchy"], index),
+                    area,
+                    "building",
+                )
+                for f in range(self.FLOORS_PER_BUILDING):
+                    if index * self.FLOORS_PER_BUILDING + f >= floors:
+                        break
+                    floor = site(
+                        "{}/Floor {}".format(building["siteNameHierarchy"], f),
+                        building,
+                        "floor",
+                    )
+                    parents[floor["id"]] = [root, area, building, floor]
+
+        floor_ids = list(parents)
+        for i in range(devices):
+            device = {
+                "id": str(uuid.uuid5(namespace, "device-{}".format(i))),
+                "hostname": "sw-{:06d}.bench.local".format(i),
+                "serialNumber": "FOC{:08d}".format(i),
+                "type": "Cisco Catalyst 9300 Switch",
+                "family": "Switches and Hubs",
+                "role": ["ACCESS", "DISTRIBUTION", "CORE"][i % 3],
+                "managementIpAddress": "10.{}.{}.{}".format(
+                    (i >> 16) & 255, (i >> 8) & 255, i & 255
+                ),
+                # Every 20th Device is unreachable
+                "reachabilityStatus": "Unreachable" if i % 20 == 0 else "Reachable",
+                "deviceSupportLevel": "Supported",
+            }
+            self.devices.append(device)
+            for parent in parents[floor_ids[i // self.DEVICES_PER_FLOOR]]:
+                self.members[parent["id"]].append(device)
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Cisco DNA Center API routes
+    """
+
+    routes = [
+        ("POST", re.compile(r"^/dna/system/api/v1/auth/token$"), "token"),
+        ("GET", re.compile(r"^/dna/intent/api/v1/site/count$"), "site_count"),
+        ("GET", re.compile(r"^/dna/intent/api/v1/site$"), "site"),
+        ("GET", re.compile(r"^/dna/intent/api/v1/membership/([^/]+)$"), "membership"),
+        (
+            "GET",
+            re.compile(r"^/dna/intent/api/v1/network-device/count$"),
+            "device_count",
+        ),
+        (
+            "GET",
+            re.compile(r"^/dna/intent/api/v1/network-device/(\d+)/(\d+)$"),
+            "network_device",
+        ),
+    ]
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        path = urlparse(self.path).path
+        if self.server.throttled():
+            self.server.calls["throttled"] = self.server.calls.get("throttled", 0) + 1
+            return self.reply(429, {"error": "Too many requests"}, {"Retry-After": "1"})
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                self.server.calls[name] = self.server.calls.get(name, 0) + 1
+                return self.reply(200, getattr(self, name)(*match.groups()))
+        self.reply(404, {"error": "Not found: {}".format(path)})
+
+    def reply(self, status, body, headers={}):
+        body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def token(self):
+        return {"Token": "benchmark"}
+
+    def site_count(self):
+        return {"response": len(self.server.dataset.sites), "version": "1.0"}
+
+    def site(self):
+        return {"response": self.server.dataset.sites}
+
+    def membership(self, site_id):
+        members = self.server.dataset.members.get(site_id, [])
+        return {
+            "site": {"response": [], "version": "1.0"},
+            "device": [{"response": members, "version": "1.0", "siteId": site_id}],
+        }
+
+    def device_count(self):
+        return {"response": len(self.server.dataset.devices), "version": "1.0"}
+
+    def network_device(self, start, count):
+        start = int(start) - 1
+        return {
+            "response": self.server.dataset.devices[start : start + int(count)],
+            "version": "1.0",
+        }
+
+
+class Throttle:
+    """
+    Answer 429 above `rate_limit` requests per minute, like Cisco DNA Center
+    """
+
+    def __init__(self, rate_limit=None):
+        self.rate_limit = rate_limit
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        if self.rate_limit is None:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.requests = [t for t in self.requests if now - t < 60]
+            if len(self.requests) >= self.rate_limit:
+                return True
+            self.requests.append(now)
+            return False
+
+
+class Server:
+    """
+    Fake Cisco DNA Center over HTTPS (self-signed, `verify` must be off)
+    """
+
+    def __init__(self, devices, host="127.0.0.1", port=0, rate_limit=None):
+        self.directory = tempfile.mkdtemp(prefix="fake_dnac_")
+        cert = os.path.join(self.directory, "cert.pem")
+        key = os.path.join(self.directory, "key.pem")
+        subprocess.run(
+            [
+                "openssl",
+                "req",
+                "-x509",
+                "-newkey",
+                "rsa:2048",
+                "-nodes",
+                "-keyout",
+                key,
+                "-out",
+                cert,
+                "-days",
+                "1",
+                "-subj",
+                "/CN=localhost",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.dataset = Dataset(devices)
+        self.httpd.calls = {}
+        self.httpd.throttled = Throttle(rate_limit)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def hostname(self):
+        return "{}:{}".format(*self.httpd.server_address)
+
+    @property
+    def calls(self):
+        return self.httpd.calls
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--rate-limit", type=int, help="requests per minute")
+    args = parser.parse_args()
+
+    server = Server(
+        args.devices, host=args.host, port=args.port, rate_limit=args.rate_limit
+    )
+    print(
+        "Fake Cisco DNA Center on https://{} ({} sites, {} devices)".format(
+            server.hostname,
+            len(server.httpd.dataset.sites),
+            len(server.httpd.dataset.devices),
+        )
+    )
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
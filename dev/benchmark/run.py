@@ -0,0 +1,290 @@
+"""
+Benchmark the ciscodnacnetbox Sync against a fake Cisco DNA Center
+
+Runs inside a NetBox installation with the plugin enabled in
+PLUGINS_CONFIG, on a throwaway test database (created and destroyed by the
+run). Wall time, database queries, Cisco DNA Center API calls and peak
+Python memory (tracemalloc) are reported per stage and written as JSON
+named after the git commit, so runs can be compared across commits. Time
+is measured in a first pass and memory in a second one, as tracemalloc
+slows the sync down.
+
+    python dev/benchmark/run.py --netbox /opt/netbox/netbox --sizes 100,5000
+    python dev/benchmark/run.py --compare results/abc1234.json results/def5678.json
+
+RQ jobs and progress use their own Redis database (`--redis-db`) and the
+cache its own key prefix, so the queue and cache of NetBox are never
+touched. The `full_sync` stage runs the RQ jobs in this process
+(SimpleWorker), it is skipped if other RQ workers listen on that database.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from fake_dnac import Server
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def setup(netbox, redis_db):
+    """
+    Load Django with the NetBox settings, on a separate RQ database and cache prefix
+    """
+    sys.path.insert(0, netbox)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "netbox.settings")
+    import django
+    from django.conf import settings
+
+    # Before any connection is made, RQ and the cache read these once
+    for queue in settings.RQ_QUEUES.values():
+        queue["DB"] = redis_db
+    for cache in settings.CACHES.values():
+        cache["KEY_PREFIX"] = "ciscodnacnetbox_benchmark"
+    django.setup()
+
+
+def commit():
+    """
+    Current git commit, marked if the tree has local changes
+    """
+    sha = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=DIRECTORY,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    dirty = subprocess.run(
+        ["git", "status", "--porcelain", "--", "../../ciscodnacnetbox"],
+        cwd=DIRECTORY,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    return "{}-dirty".format(sha) if dirty else sha
+
+
+def measure(server, func):
+    """
+    Run `func` and return wall time, queries and API calls
+    """
+    from django.db import connection
+
+    queries = [0]
+
+    def counter(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    calls = sum(server.calls.values())
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        func()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 3),
+        "queries": queries[0],
+        "api_calls": sum(server.calls.values()) - calls,
+    }
+
+
+def memory(func):
+    """
+    Run `func` and return its peak Python memory
+    """
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"peak_mb": round(peak / 1024 / 1024, 1)}
+
+
+def reset(hostname):
+    """
+    Remove everything a previous size has synced
+    """
+    from django.core.cache import cache
+    from django_rq import get_queue
+    from dcim.models import (
+        Device,
+        DeviceRole,
+        DeviceType,
+        Location,
+        Manufacturer,
+        Region,
+        Site,
+    )
+    from ipam.models import IPAddress
+    from tenancy.models import Tenant
+    from ciscodnacnetbox.ciscodnac.data import Data
+    from ciscodnacnetbox.models import Settings
+
+    Device.objects.all().delete()
+    IPAddress.objects.all().delete()
+    Location.objects.all().delete()
+    Site.objects.all().delete()
+    Region.objects.all().delete()
+    DeviceType.objects.all().delete()
+    DeviceRole.objects.all().delete()
+    Manufacturer.objects.all().delete()
+    Tenant.objects.all().delete()
+    Settings.objects.all().delete()
+    cache.delete_many(
+        [
+            "ciscodnacnetbox_status",
+            "ciscodnacnetbox_status_bg",
+            "ciscodnacnetbox_bg",
+            "ciscodnacnetbox_members_{}".format(hostname),
+            Data.inventory_key("devices", hostname),
+            Data.inventory_key("sites", hostname),
+        ]
+    )
+    # Queue of the benchmark Redis database
+    get_queue("default").empty()
+
+
+def full_sync(pk):
+    """
+    Queue the full Sync and run its RQ jobs in this process
+    """
+    from django_rq import get_worker
+    from rq import SimpleWorker
+    from ciscodnacnetbox.ciscodnac.data import Data
+
+    Data.sync_enqueue(pk=pk)
+    get_worker("default", worker_class=SimpleWorker).work(burst=True)
+
+
+def benchmark(size):
+    """
+    Sync stages for one inventory size
+    """
+    from django_rq import get_worker
+    from django_rq.queues import get_connection
+    from ciscodnacnetbox.ciscodnac.data import Data
+    from ciscodnacnetbox.models import Settings
+
+    server = Server(size).start()
+    try:
+        results = {}
+        # Timed pass, then the same stages from scratch for the memory
+        for traced in [False, True]:
+            reset(server.hostname)
+            settings = Settings.objects.create(
+                hostname=server.hostname,
+                username="benchmark",
+                password="benchmark",
+                version="2.1.2",
+                verify=False,
+                status=True,
+            )
+            pk = settings.pk
+            stages = [
+                ("sync_sites", lambda: Data.sync_sites(pk=pk)),
+                ("sync_devices", lambda: Data.sync_devices(pk=pk)),
+                ("sync_sites_unchanged", lambda: Data.sync_sites(pk=pk)),
+                ("sync_devices_unchanged", lambda: Data.sync_devices(pk=pk)),
+                (
+                    "sync_devices_reconcile",
+                    lambda: Data.sync_devices(pk=pk, reconcile=True),
+                ),
+            ]
+            if get_worker("default").count(get_connection("default")) == 0:
+                stages.append(("full_sync", lambda: full_sync(pk)))
+            elif traced is False:
+                print("Skip full_sync, other RQ workers are running")
+            stages.append(("status", lambda: Data.status(refresh=True)))
+
+            for name, func in stages:
+                if traced:
+                    results.setdefault(name, {}).update(memory(func))
+                    print("{:>7} {:<24} {}".format(size, name, results[name]))
+                else:
+                    results[name] = measure(server, func)
+        return results
+    finally:
+        server.stop()
+
+
+def run(args):
+    setup(args.netbox, args.redis_db)
+    from django.db import connection
+
+    # Throwaway database, the NetBox database is never touched
+    name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=args.keepdb
+    )
+    try:
+        results = {str(size): benchmark(size) for size in args.sizes}
+    finally:
+        connection.creation.destroy_test_db(name, verbosity=0, keepdb=args.keepdb)
+
+    data = {
+        "commit": commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        DIRECTORY, "results", "{}.json".format(data["commit"])
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(data, f, indent=2)
+    print("Results written to {}".format(output))
+
+
+def compare(old, new):
+    """
+    Print the change per size, stage and metric between two result files
+    """
+    with open(old) as f:
+        old = json.load(f)
+    with open(new) as f:
+        new = json.load(f)
+    print("{} -> {}".format(old["commit"], new["commit"]))
+    for size, stages in new["results"].items():
+        for stage, metrics in stages.items():
+            before = old["results"].get(size, {}).get(stage)
+            if before is None:
+                continue
+            changes = []
+            for metric, value in metrics.items():
+                if before[metric]:
+                    changes.append(
+                        "{} {} -> {} ({:+.0%})".format(
+                            metric,
+                            before[metric],
+                            value,
+                            (value - before[metric]) / before[metric],
+                        )
+                    )
+            print("{:>7} {:<24} {}".format(size, stage, ", ".join(changes)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--netbox", default="/opt/netbox/netbox")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[100, 5000, 50000],
+    )
+    parser.add_argument("--keepdb", action="store_true")
+    parser.add_argument(
+        "--redis-db", type=int, default=15, help="Redis database of the RQ jobs"
+    )
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
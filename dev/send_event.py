@@ -0,0 +1,101 @@
+"""
+Send Cisco DNA Center Event Notifications to the ciscodnacnetbox webhook
+
+Stand-in for a Cisco DNA Center REST webhook destination, to test the
+targeted sync without a controller sending events.
+
+    python dev/send_event.py --url http://localhost:8000 --tenant dnac.example.com \
+        --event unreachable --device 10.10.20.51 --secret s3cret
+    python dev/send_event.py --url http://localhost:8000 --tenant dnac.example.com \
+        --event site --site 5e3f5a10-0a2b-4c6d-8e9f-123456789abc --secret s3cret
+"""
+
+import argparse
+import json
+import ssl
+import time
+import uuid
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# Shapes of the Cisco DNA Center events (only the ids matter to the plugin)
+EVENTS = {
+    "added": {
+        "eventId": "NETWORK-DEVICES-2-101",
+        "name": "Device added to inventory",
+        "category": "INFO",
+    },
+    "removed": {
+        "eventId": "NETWORK-DEVICES-2-102",
+        "name": "Device removed from inventory",
+        "category": "INFO",
+    },
+    "unreachable": {
+        "eventId": "NETWORK-DEVICES-3-506",
+        "name": "Device unreachable",
+        "category": "ALERT",
+    },
+    "site": {
+        "eventId": "NETWORK-SITES-2-101",
+        "name": "Site updated",
+        "category": "INFO",
+    },
+}
+
+
+def event(name, tenant, device=None, site=None):
+    """
+    Cisco DNA Center Event Notification
+    """
+    details = {"Type": "Network Device"}
+    if device is not None:
+        details["Device"] = device
+    if site is not None:
+        details["siteId"] = site
+    return {
+        "version": "1.0.0",
+        "instanceId": str(uuid.uuid4()),
+        "namespace": "ASSURANCE",
+        "type": "NETWORK",
+        "domain": "Know Your Network",
+        "subDomain": "Devices",
+        "severity": 3,
+        "source": "ndp",
+        "timestamp": int(time.time() * 1000),
+        "details": details,
+        "ciscoDnaEventLink": "https://{}/dna/assurance/home".format(tenant),
+        **EVENTS[name],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8000", help="NetBox URL")
+    parser.add_argument("--tenant", required=True, help="Cisco DNA Center hostname")
+    parser.add_argument("--event", choices=sorted(EVENTS), default="added")
+    parser.add_argument("--device", help="UUID, serial number, IP or hostname")
+    parser.add_argument("--site", help="Site UUID")
+    parser.add_argument("--secret", required=True, help="events_secret of the plugin")
+    parser.add_argument("--insecure", action="store_true", help="skip TLS checks")
+    args = parser.parse_args()
+
+    if args.device is None and args.site is None:
+        parser.error("--device or --site is required")
+
+    url = "{}/api/plugins/ciscodnacnetbox/events/?{}".format(
+        args.url.rstrip("/"), urlencode({"tenant": args.tenant})
+    )
+    body = json.dumps(event(args.event, args.tenant, args.device, args.site))
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": "Bearer {}".format(args.secret),
+    }
+
+    context = ssl._create_unverified_context() if args.insecure else None
+    request = Request(url, data=body.encode("utf-8"), headers=headers, method="POST")
+    with urlopen(request, context=context) as response:
+        print(response.status, response.read().decode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
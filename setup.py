@@ -30,6 +30,8 @@ setup(
     author_email="rcsapo@cisco.com",
     license="CISCO SAMPLE CODE LICENSE",
     install_requires=requirements,
+    # asyncio API Client
+    extras_require={"async": ["httpx>=0.18"]},
     packages=find_packages(exclude=["img", "dev"]),
     include_package_data=True,
     python_requires=">=3.3",